@@ -1,14 +1,38 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
+from flask import (
+    Flask, render_template, request, jsonify, redirect, url_for, abort, session,
+    Response, stream_with_context, g,
+)
 from flask_sqlalchemy import SQLAlchemy
+from markupsafe import escape
 from openai import OpenAI
-from importlib import reload
 import os
 import json
-import random
 import logging
-import difflib
 import time
-import sys
+import signal
+import atexit
+import gzip
+import sqlite3
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+from logging_setup import configure_logging
+from explanation_cache import ExplanationCache, explanation_key
+from explainer import request_explanation, stream_explanation, clean_explanation
+from question_repository import QuestionRepository
+from quiz_sessions import QuizSession, create_session_store
+from explanation_engine import ExplanationEngine
+from model_gateway import ModelGateway
+from singleflight import SingleFlight, FileLockSingleFlight
+from attempt_recorder import AttemptRecorder
+from log_reader import tail_lines, tail_text
+from patch_pipeline import PatchPipeline
+from diagnostics_service import DiagnosticsService
+from state_store import StateStore
+from metrics import Metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from profiler import Profiler
+from assets import init_assets, DIST_NAME, MANIFEST_NAME
+from page_cache import PageCache
 
 app = Flask(__name__)
 app.secret_key = "your_secret_key"
@@ -16,11 +40,14 @@ app.secret_key = "your_secret_key"
 # ---------------------------
 # Logging Setup
 # ---------------------------
-logging.basicConfig(
-    filename='error.log',
-    level=logging.ERROR,
-    format='%(asctime)s %(levelname)s:%(message)s'
+# JSON lines via a background queue listener; error.log and app.log rotate by size
+log_handler = configure_logging(
+    max_bytes=int(os.environ.get("LOG_MAX_BYTES", 10 * 1024 * 1024)),
+    backup_count=int(os.environ.get("LOG_BACKUP_COUNT", 5)),
 )
+logger = logging.getLogger("quiz")
+access_logger = logging.getLogger("quiz.access")
+atexit.register(log_handler.stop)
 
 # ---------------------------
 # Flask App Setup
@@ -30,7 +57,16 @@ OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY not set in environment!")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Retries, deadlines and the in-flight cap live in the gateway, not the client
+openai_client = OpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+client = ModelGateway(
+    openai_client,
+    max_in_flight=int(os.environ.get("MODEL_MAX_IN_FLIGHT", 8)),
+    timeout=float(os.environ.get("MODEL_TIMEOUT", 30)),
+    retries=int(os.environ.get("MODEL_RETRIES", 2)),
+    failure_threshold=int(os.environ.get("MODEL_BREAKER_THRESHOLD", 5)),
+    reset_timeout=float(os.environ.get("MODEL_BREAKER_RESET", 30)),
+)
 
 # Ensure instance folder exists
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -43,6 +79,47 @@ app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
 
+# Explanation cache (LRU in memory + SQLite next to users.db)
+explanation_ttl = os.environ.get("EXPLANATION_CACHE_TTL")
+explanation_cache = ExplanationCache(
+    os.path.join(instance_path, "explanations.db"),
+    max_memory_items=int(os.environ.get("EXPLANATION_CACHE_SIZE", 2048)),
+    ttl=float(explanation_ttl) if explanation_ttl else None,
+)
+
+# Question banks are parsed once and re-read only when a file changes
+question_repo = QuestionRepository(
+    os.path.join(basedir, "questions"),
+    # Compiled .qbank files only pay off for big banks; small ones are faster parsed
+    compiled_min_bytes=int(os.environ.get("QUIZ_QBANK_MIN_BYTES", 1024 * 1024)),
+)
+# Hashed, precompressed static files from `python assets.py` (asset_url in templates)
+asset_manifest = init_assets(app, os.path.join(basedir, "static"))
+# Home and study pages are rendered once; edits to these paths drop the copies
+page_cache = PageCache(
+    [
+        os.path.join(basedir, "templates"),
+        os.path.join(basedir, "questions"),
+        os.path.join(basedir, "static", DIST_NAME, MANIFEST_NAME),
+    ],
+    check_interval=float(os.environ.get("PAGE_CACHE_CHECK_INTERVAL", 2)),
+)
+patch_pipeline = PatchPipeline(basedir)
+
+# Patch / restart history shown on the auto-maintain dashboard
+state_store = StateStore(
+    os.path.join(instance_path, "auto_maintain_state.db"),
+    legacy_json=os.path.join(basedir, "auto_maintain_state.json"),
+)
+state_store.compact(keep=int(os.environ.get("STATE_HISTORY_SIZE", 1000)))
+
+# Server-side quiz sessions ("sqlite" is shared across gunicorn workers, "memory" is per process)
+quiz_sessions = create_session_store(
+    os.environ.get("QUIZ_SESSION_STORE", "sqlite"),
+    instance_path,
+    ttl=int(os.environ.get("QUIZ_SESSION_TTL", 3600)),
+)
+
 # ---------------------------
 # Database Models (still used)
 # ---------------------------
@@ -59,84 +136,188 @@ class QuizAttempt(db.Model):
     language = db.Column(db.String(50), nullable=False)
     user_id_fk = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
 
+class AnswerEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    session_token = db.Column(db.String(32), nullable=False, index=True)
+    question_index = db.Column(db.Integer, nullable=False)
+    total_questions = db.Column(db.Integer, nullable=False)
+    language = db.Column(db.String(50), nullable=False)
+    question_id = db.Column(db.String(12), nullable=True)
+    selected = db.Column(db.Text, nullable=True)
+    correct_answer = db.Column(db.Text, nullable=True)
+    is_correct = db.Column(db.Boolean, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+    __table_args__ = (db.UniqueConstraint('session_token', 'question_index'),)
+
+@event.listens_for(Engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers keep going while the recorder writes a batch
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
 with app.app_context():
     db.create_all()
 
+# Answers are buffered and written in batches by a background thread
+attempt_recorder = AttemptRecorder(
+    app, db, AnswerEvent, QuizAttempt,
+    flush_size=int(os.environ.get("ATTEMPT_FLUSH_SIZE", 100)),
+    flush_interval=float(os.environ.get("ATTEMPT_FLUSH_INTERVAL", 2)),
+    max_buffer=int(os.environ.get("ATTEMPT_MAX_BUFFER", 10000)),
+)
+atexit.register(attempt_recorder.close)
+
 # ---------------------------
 # Utility Functions
 # ---------------------------
 def get_available_quizzes():
-    quiz_folder = os.path.join(os.getcwd(), "questions")
-    return [f.replace(".json", "") for f in os.listdir(quiz_folder) if f.endswith(".json")]
-
-
-def generate_explanation(question_text, user_answer, correct_answer, all_options):
-    """
-    Generate a detailed explanation for a multiple-choice question.
-    This version:
-    - Uses gpt-4o for more complete responses
-    - Increases max tokens to reduce truncation
-    - Provides fallback text if the API fails
-    - Cleans up leading whitespace and formatting
-    """
-    # Make sure options are a string for the prompt
-    options_str = ", ".join(all_options) if isinstance(all_options, list) else str(all_options)
-
-    prompt = f"""
-Question: {question_text}
-Options: {options_str}
-Correct Answer: {correct_answer}
-User Selected: {user_answer}
-
-Explain in detail:
-1. Why the correct answer is correct:
-2. For each incorrect option, explain why it is wrong:
-3. Why the user's selected answer may be incorrect:
-
-Format in plain text. Do NOT use markdown or asterisks.
-"""
-
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",  # use gpt-4o for better completions
-            messages=[{"role": "user", "content": prompt}],
-            max_completion_tokens=800
-        )
-
-        explanation = getattr(response.choices[0].message, "content", "").strip()
-        # Ensure no leading whitespace on each line
-        explanation = "\n".join(line.lstrip() for line in explanation.splitlines())
-
-        # If explanation is empty, provide fallback
-        if not explanation:
-            explanation = "No detailed explanation available. Please review the correct answer carefully."
-
-    except Exception as e:
-        print("OpenAI API call failed:", e)
-        explanation = "No explanation available. Please try again."
-
-    return explanation
+    return question_repo.languages()
+
+# Drop cached explanations for questions that were edited or removed
+explanation_cache.prune(q.text for q in question_repo.iter_all())
+
+# Cache -> AI (within budget) -> bundled explanation from the question bank
+explanation_engine = ExplanationEngine(
+    explanation_cache,
+    lambda *args: request_explanation(client, *args),
+    stream_generate=lambda *args: stream_explanation(client, *args),
+    mode=os.environ.get("EXPLANATION_MODE", "ai"),
+    ai_budget=float(os.environ.get("EXPLANATION_AI_BUDGET", 8)),
+    prefetch_workers=int(os.environ.get("EXPLANATION_PREFETCH_WORKERS", 2)),
+    upgrade=os.environ.get("EXPLANATION_UPGRADE", "1") == "1",
+    # Coalesce identical requests across gunicorn workers too, not just threads
+    flight=(
+        FileLockSingleFlight(os.path.join(instance_path, "locks"))
+        if os.environ.get("EXPLANATION_COALESCE_PROCESSES", "1") == "1"
+        else SingleFlight()
+    ),
+)
+# Let quiz pages warm the explanations of the question being read and the next few
+QUIZ_PREFETCH = os.environ.get("QUIZ_PREFETCH", "1") == "1"
+QUIZ_PREFETCH_AHEAD = int(os.environ.get("QUIZ_PREFETCH_AHEAD", 2))
+
+diagnostics_service = DiagnosticsService(
+    client,
+    "error.log",
+    os.path.join(instance_path, "diagnostics.db"),
+    flight=FileLockSingleFlight(os.path.join(instance_path, "locks")),
+)
 
+# ---------------------------
+# Metrics
+# ---------------------------
+metrics = Metrics(os.path.join(instance_path, "metrics"))
+metrics.describe("quiz_model_calls_total", "counter", "Model calls through the gateway")
+metrics.describe("quiz_model_errors_total", "counter", "Model calls that failed")
+metrics.describe("quiz_model_rejected_total", "counter", "Model calls rejected by the circuit breaker or in-flight cap")
+metrics.describe("quiz_model_in_flight", "gauge", "Model calls in progress")
+metrics.describe("quiz_model_circuit_open", "gauge", "Workers whose model circuit breaker is open or half-open")
+metrics.describe("quiz_model_latency_seconds", "histogram", "Model call latency")
+metrics.describe("quiz_explanation_cache_hits_total", "counter", "Explanation cache hits by tier")
+metrics.describe("quiz_explanation_cache_misses_total", "counter", "Explanation cache misses")
+metrics.describe("quiz_explanation_cache_hit_ratio", "gauge", "Explanation cache hits / lookups across workers")
+metrics.describe("quiz_explanations_total", "counter", "Explanations served by source")
+metrics.describe("quiz_recorder_buffered", "gauge", "Quiz answers waiting to be written")
+metrics.describe("quiz_recorder_failures_total", "counter", "Failed answer flushes")
+metrics.describe("quiz_page_cache_responses_total", "counter", "Cached page responses by result")
+
+def model_samples():
+    stats = client.stats()
+    yield "quiz_model_calls_total", {}, stats["calls"]
+    yield "quiz_model_errors_total", {}, stats["errors"]
+    yield "quiz_model_rejected_total", {}, stats["rejected"]
+    yield "quiz_model_in_flight", {}, stats["in_flight"]
+    yield "quiz_model_circuit_open", {}, int(stats["circuit_state"] != "closed")
+    for bound, count in stats["latency_histogram"].items():
+        yield "quiz_model_latency_seconds_bucket", {"le": bound}, count
+    yield "quiz_model_latency_seconds_sum", {}, stats["latency_sum"]
+    yield "quiz_model_latency_seconds_count", {}, stats["calls"]
+
+def cache_samples():
+    stats = explanation_cache.stats()
+    yield "quiz_explanation_cache_hits_total", {"tier": "memory"}, stats["hits_memory"]
+    yield "quiz_explanation_cache_hits_total", {"tier": "disk"}, stats["hits_disk"]
+    yield "quiz_explanation_cache_misses_total", {}, stats["misses"]
+    for source in ("cache", "ai", "bundled", "coalesced"):
+        yield "quiz_explanations_total", {"source": source}, explanation_engine.counts[source]
+    recorder = attempt_recorder.stats()
+    yield "quiz_recorder_buffered", {}, recorder["buffered"]
+    yield "quiz_recorder_failures_total", {}, recorder["failures"]
+    pages = page_cache.stats()
+    yield "quiz_page_cache_responses_total", {"result": "hit"}, pages["hits"]
+    yield "quiz_page_cache_responses_total", {"result": "not_modified"}, pages["not_modified"]
+    yield "quiz_page_cache_responses_total", {"result": "render"}, pages["renders"]
+
+metrics.add_collector(model_samples)
+metrics.add_collector(cache_samples)
+metrics.add_derived("quiz_explanation_cache_hit_ratio", lambda total: round(
+    total("quiz_explanation_cache_hits_total")
+    / (total("quiz_explanation_cache_hits_total") + total("quiz_explanation_cache_misses_total")), 4))
 
-def load_questions(language, num_questions=10):
-    with open(f"questions/{language}.json") as f:
-        all_questions = json.load(f)
-    return random.sample(all_questions, min(num_questions, len(all_questions)))
+# ---------------------------
+# Profiling (opt-in)
+# ---------------------------
+profiler = None
+if os.environ.get("QUIZ_PROFILING") == "1":
+    profiler = Profiler(app, slow_requests=int(os.environ.get("QUIZ_PROFILING_SLOWEST", 20)))
+    profiler.instrument(client.chat.completions, "create", "model")
+    profiler.watch_sqlalchemy(Engine)
+    for route in filter(None, os.environ.get("QUIZ_PROFILING_SAMPLE", "").split(",")):
+        profiler.set_sampling(route.strip())
+
+
+def start_quiz_session(language, num_questions=10):
+    """Create a quiz session, store it server-side and remember its token in the cookie."""
+    if not question_repo.has_language(language):
+        abort(404)
+    quiz = QuizSession.create(question_repo, language, num_questions)
+    quiz_sessions.save(quiz)
+    session[f"quiz_{language}"] = quiz.token
+    return quiz
+
+
+def current_quiz_session(language, token=None):
+    """Look up the caller's quiz session (explicit token first, then the cookie)."""
+    token = token or session.get(f"quiz_{language}")
+    quiz = quiz_sessions.get(token)
+    if quiz is None or quiz.language != language:
+        return None
+    return quiz
+
+
+def session_questions(quiz):
+    """Resolve a session's question IDs (skipping any removed from the bank since)."""
+    questions = (question_repo.get(quiz.language, qid) for qid in quiz.question_ids)
+    return [q for q in questions if q is not None]
 
 # ---------------------------
 # Admin: Apply Patch
 # ---------------------------
+def reload_after_patch():
+    """Get patched code running: a rolling restart under server.py, the reloader in debug."""
+    if os.environ.get("QUIZ_LISTEN_FD"):
+        os.kill(os.getppid(), signal.SIGHUP)
+        state_store.record_restart(reason="patch")
+        return "rolling restart"
+    return "picked up by the reloader" if app.debug else "restart required"
+
 @app.route("/admin/apply_patch", methods=["POST"])
 def apply_patch():
-    patch_text = request.form["patch"]
-    file_path = request.form["file"]
-
-    with open(file_path, "r") as f:
-        original = f.readlines()
+    # The dashboard posts JSON, older forms post form data
+    data = request.get_json(silent=True) or request.form
+    patch_text = data["patch"]
+    file_path = data["file"]
 
-    with open(file_path, "w") as f:
-        f.writelines(difflib.restore(patch_text.splitlines(), 1))
+    result = patch_pipeline.run(patch_text, target=os.path.relpath(file_path, basedir))
+    if not result.ok:
+        return f"<h1>Patch Rejected</h1><p>Failed at {result.stage}.</p><pre>{escape(result.detail)}</pre>", 400
 
+    state_store.append("patch", file=file_path, patch=patch_text, source="manual")
+    reload_after_patch()
     return "<h1>Patch Applied!</h1><p>Your code has been updated.</p>"
 
 # ---------------------------
@@ -156,11 +337,7 @@ def auto_fix():
     with open(file_path, "r") as f:
         code = f.read()
 
-    try:
-        with open("error.log", "r") as f:
-            error_log = f.read()[-5000:]
-    except:
-        error_log = "No error logs available."
+    error_log = tail_text("error.log", 5000) or "No error logs available."
 
     prompt = f"""
     You are an expert software engineer.
@@ -183,7 +360,7 @@ def auto_fix():
             max_completion_tokens=500
         )
         patch = getattr(response.choices[0].message, "content", "No patch returned.")
-        print("\n=== PATCH GENERATED ===\n", patch, "\n======================\n")
+        logger.info("Patch generated", extra={"file": file_path, "patch": patch})
     except Exception as e:
         return jsonify({"error": f"OpenAI failure: {e}"}), 500
 
@@ -194,96 +371,169 @@ def auto_fix():
     if "@@" not in patch:
         return jsonify({"error": "Patch missing hunk (@@)", "patch": patch}), 400
 
-    original = open(file_path).read().splitlines(keepends=True)
-    patch_lines = patch.splitlines(keepends=True)
-
-    try:
-        patched = difflib.patch_from_unified_diff(patch_lines, original)
-    except Exception as e:
-        return jsonify({"error": f"Patch error: {e}", "patch": patch}), 500
-
-    with open(file_path, "w") as f:
-        f.writelines(patched)
-
-    # Reload
-    module_name = os.path.splitext(os.path.basename(file_path))[0]
-    if module_name in sys.modules:
-        try:
-            reload(sys.modules[module_name])
-        except Exception as e:
-            print("Reload failed:", e)
+    # Applied and checked in a scratch copy; live files change only if it passes
+    result = patch_pipeline.run(patch, target=os.path.relpath(file_path, basedir))
+    if not result.ok:
+        return jsonify({"error": f"Patch rejected at {result.stage}", "detail": result.detail, "patch": patch}), 400
 
-    return jsonify({"patch": patch, "status": "Patch applied"})
+    state_store.append("patch", file=file_path, patch=patch, source="auto_fix")
+    return jsonify({"patch": patch, "status": "Patch applied", "reload": reload_after_patch()})
 
 # ---------------------------
 # Admin Dashboard + State
 # ---------------------------
-STATE_FILE = "auto_maintain_state.json"
-
-def load_state():
-    if os.path.exists(STATE_FILE):
-        return json.load(open(STATE_FILE))
-    return {"patches": [], "restarts": 0}
-
-def save_state(state):
-    json.dump(state, open(STATE_FILE, "w"), indent=2)
+DASHBOARD_PAGE_SIZE = 20
+
+def dashboard_state(limit=DASHBOARD_PAGE_SIZE, offset=0):
+    return {
+        "patches": state_store.latest("patch", limit=limit, offset=offset),
+        "total_patches": state_store.count("patch"),
+        "restarts": state_store.counter("restarts"),
+        "errors": tail_lines("error.log", 50)[::-1],
+        "health_score": 100,
+        "slow_requests": profiler.slowest() if profiler else None,
+    }
 
 @app.route("/admin/auto_dashboard")
 def auto_dashboard():
-    state = load_state()
-    patches = state.get("patches", [])
-    restarts = state.get("restarts", 0)
+    return render_template("admin/auto_dashboard.html", page_size=DASHBOARD_PAGE_SIZE, **dashboard_state())
 
-    errors = []
-    if os.path.exists("error.log"):
-        errors = open("error.log").readlines()[-50:]
-
-    return render_template(
-        "admin/auto_dashboard.html",
-        errors=errors[::-1],
-        patches=patches[::-1],
-        restarts=restarts,
-        health_score=100
-    )
+@app.route("/admin/auto_dashboard_state")
+def auto_dashboard_state():
+    limit = min(max(request.args.get("limit", DASHBOARD_PAGE_SIZE, type=int), 1), 200)
+    offset = max(request.args.get("offset", 0, type=int), 0)
+    return jsonify(dashboard_state(limit, offset))
 
 # ---------------------------
 # Diagnostics
 # ---------------------------
 @app.route("/admin/diagnostics")
 def diagnostics():
+    # Served from the cache; a changed log window is analyzed in the background
+    result = diagnostics_service.current()
+    return render_template("admin/diagnostics.html", **result)
 
-    logs = open("error.log", "r").read()[-5000:] if os.path.exists("error.log") else "No logs."
+@app.route("/admin/diagnostics.json")
+def diagnostics_json():
+    return jsonify(diagnostics_service.current())
 
-    prompt = f"""
-    Analyze these logs and explain:
-    - What caused the errors
-    - Where they happen in code
-    - How to fix them
-    """
+# ---------------------------
+# Request Logging
+# ---------------------------
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def log_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        access_logger.info("request", extra={
+            "route": request.url_rule.rule if request.url_rule else request.path,
+            "method": request.method,
+            "status": response.status_code,
+            "latency_ms": round(elapsed * 1000, 2),
+        })
+        # Unmatched paths share one label so 404 scans can't blow up the series count
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        metrics.observe_request(route, request.method, response.status_code, elapsed)
+    return response
 
-    try:
-        res = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            max_completion_tokens=500
-        )
-        analysis = res.choices[0].message.content
-    except:
-        analysis = "OpenAI diagnostic failed."
+# ---------------------------
+# Explanation Cache Stats
+# ---------------------------
+@app.route("/admin/cache_stats")
+def cache_stats():
+    return jsonify(dict(
+        explanation_cache.stats(),
+        engine=explanation_engine.stats(),
+        recorder=attempt_recorder.stats(),
+        pages=page_cache.stats(),
+    ))
+
+@app.route("/admin/model_stats")
+def model_stats():
+    return jsonify(client.stats())
 
-    return render_template("admin/diagnostics.html", logs=logs, analysis=analysis)
+# ---------------------------
+# Profiler
+# ---------------------------
+def require_profiler():
+    if profiler is None:
+        abort(404, description="Profiling is off; start the app with QUIZ_PROFILING=1")
+    return profiler
+
+@app.route("/admin/profiler")
+def profiler_stats():
+    return jsonify(require_profiler().stats())
+
+@app.route("/admin/profiler/sampling", methods=["POST"])
+def profiler_sampling():
+    data = request.get_json(silent=True) or request.form
+    route = data.get("route")
+    if not route:
+        return jsonify({"error": "route is required"}), 400
+    enabled = str(data.get("enabled", "true")).lower() in ("1", "true", "on", "yes")
+    require_profiler().set_sampling(route, enabled)
+    return jsonify({"sampling": profiler.stats()["sampling"]})
+
+@app.route("/admin/profiler/collapsed")
+def profiler_collapsed():
+    # Feed to flamegraph.pl or load into speedscope
+    return Response(require_profiler().collapsed(request.args.get("route")), mimetype="text/plain")
+
+@app.route("/admin/profiler/reset", methods=["POST"])
+def profiler_reset():
+    require_profiler().reset()
+    return jsonify({"status": "reset"})
+
+# ---------------------------
+# Metrics Endpoint
+# ---------------------------
+@app.route("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
 # ---------------------------
 # Health Endpoint
 # ---------------------------
+@app.route("/health/live")
+def liveness():
+    # Liveness only: a database outage shouldn't get the process restarted
+    return jsonify({"status": "alive"}), 200
+
 @app.route("/health")
 def health():
-    return jsonify({"status": "healthy"}), 200
+    """
+    Readiness: 503 when the database or the question banks are unusable.
+    An open model circuit only degrades the service (bundled explanations
+    still work), so it is reported but keeps the 200.
+    """
+    checks = {}
+    try:
+        db.session.execute(text("SELECT 1"))
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"error: {e}"
+
+    languages = question_repo.languages()
+    checks["question_banks"] = "ok" if languages else "error: no question banks loaded"
+    checks["model_circuit"] = client.stats()["circuit_state"]
+
+    if any(str(v).startswith("error") for v in checks.values()):
+        status, code = "unhealthy", 503
+    elif checks["model_circuit"] != "closed":
+        status, code = "degraded", 200
+    else:
+        status, code = "healthy", 200
+    return jsonify({"status": status, "checks": checks, "languages": languages}), code
 
 # ---------------------------
 # QUIZ ROUTES (NO LOGIN)
 # ---------------------------
 @app.route("/")
+@page_cache.cached
 def home():
     quizzes = get_available_quizzes()
     intro = (
@@ -295,88 +545,259 @@ def home():
 
 @app.route("/quiz/<language>")
 def quiz_page(language):
-    questions = load_questions(language)
+    quiz = start_quiz_session(language)
+    questions = [q.to_dict() for q in session_questions(quiz)]
     index = 0
     score = 0
-    return render_template("quiz/quiz_ajax.html", language=language, questions=questions, index=index, score=score)
+    return render_template(
+        "quiz/quiz_ajax.html",
+        language=language,
+        questions=questions,
+        index=index,
+        score=score,
+        quiz_token=quiz.token,
+        prefetch_ahead=QUIZ_PREFETCH_AHEAD,
+    )
 
 
 @app.route("/log_click", methods=["POST"])
 def log_click():
     data = request.get_json()
     option = data.get("option")
-    print(f"[CLICK] Option clicked: {option}")  # terminal output
+    logger.info("Option clicked", extra={"option": option})
     return jsonify({"status": "ok"})
 
 @app.route("/quiz/<language>/get_question")
 def get_question(language):
     index = int(request.args.get("i", 0))
-    questions = load_questions(language)
+    quiz = current_quiz_session(language, request.args.get("token"))
+    if quiz is None:
+        quiz = start_quiz_session(language)
 
-    if index >= len(questions):
-        return jsonify({"finished": True})
+    qid = quiz.question_id(index)
+    q = question_repo.get(language, qid) if qid else None
 
-    q = questions[index]
+    if q is None:
+        return jsonify({"finished": True})
 
     return jsonify({
         "finished": False,
         "question_number": index + 1,
-        "total_questions": len(questions),
-        "question": q["question"],
-        "options": q.get("options", []),
+        "total_questions": len(quiz.question_ids),
+        "question_id": q.id,
+        "question": q.text,
+        "options": list(q.options),
     })
 
-@app.route("/quiz/<language>/answer", methods=["POST"])
-def answer(language):
-    data = request.get_json()
+def compressed_json(payload, status=200):
+    """JSON response, gzip'd when the client accepts it."""
+    body = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    response = Response(body, status=status, mimetype="application/json")
+    response.vary.add("Accept-Encoding")
+    if "gzip" in request.headers.get("Accept-Encoding", "") and len(body) > 1024:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+@app.route("/quiz/<language>/bundle")
+def quiz_bundle(language):
+    """
+    The whole quiz session in one response: questions, answers, and every
+    explanation already cached for each option. The page grades locally and
+    only asks the server for explanations missing from here.
+    """
+    quiz = current_quiz_session(language, request.args.get("token"))
+    if quiz is None:
+        return jsonify({"error": "Unknown or expired quiz session"}), 404
+
+    questions = session_questions(quiz)
+    keys = {
+        (index, opt): explanation_key(q.text, list(q.options), q.answer, opt)
+        for index, q in enumerate(questions) for opt in q.options
+    }
+    cached = explanation_cache.peek_many(list(set(keys.values())))
+
+    items = []
+    for index, q in enumerate(questions):
+        item = q.to_dict()
+        item["explanations"] = {
+            opt: cached[keys[(index, opt)]] for opt in q.options if keys[(index, opt)] in cached
+        }
+        items.append(item)
+    return compressed_json({"token": quiz.token, "language": language, "questions": items})
+
+@app.route("/quiz/<language>/prefetch", methods=["POST"])
+def prefetch_explanations(language):
+    """Warm the explanations of the question being read and the next QUIZ_PREFETCH_AHEAD - 1 in the background."""
+    data = request.get_json(silent=True) or {}
+    quiz = current_quiz_session(language, data.get("token"))
+    if quiz is None or data.get("index") is None:
+        return jsonify({"error": "token and index are required"}), 400
+    # Only when the model has room to spare: students' answers come first
+    gateway = client.stats()
+    if (not QUIZ_PREFETCH or gateway["circuit_state"] != "closed"
+            or gateway["in_flight"] >= gateway["max_in_flight"]):
+        return jsonify({"started": 0}), 202
+
+    index = int(data["index"])
+    started = 0
+    for i in range(index, index + QUIZ_PREFETCH_AHEAD):
+        q = question_repo.get(language, quiz.question_id(i))
+        if q is not None:
+            started += explanation_engine.prefetch(q.text, q.answer, list(q.options))
+    return jsonify({"started": started}), 202
+
+@app.route("/quiz/<language>/record", methods=["POST"])
+def record_answer(language):
+    """Record an answer the page graded itself from the bundle (sent with navigator.sendBeacon)."""
+    data = request.get_json(force=True, silent=True) or {}
+    quiz = current_quiz_session(language, data.get("token"))
+    if quiz is None or data.get("index") is None:
+        return jsonify({"error": "token and index are required"}), 400
+
+    index = int(data["index"])
+    q = question_repo.get(language, quiz.question_id(index))
+    if q is None:
+        return jsonify({"error": "Unknown question"}), 404
+    selected = selected_option(data)
+    attempt_recorder.record_answer(
+        quiz.token, index, len(quiz.question_ids), language, q.id, selected, q.answer
+    )
+    return jsonify({"status": "ok", "correct": selected == q.answer})
 
-    question_text = data.get("question")
+
+def selected_option(data):
+    """The selected option as text (None when missing); a list or number in the payload must not reach the DB."""
     selected = data.get("selected")
+    return None if selected is None else str(selected)
+
+
+def resolve_answer(language, data):
+    """Work out (question, selected, correct, options, bank explanation) for an /answer payload."""
+    question_text = data.get("question")
+    selected = selected_option(data)
     correct = data.get("correct")
     options = data.get("options", [])
 
-    explanation = generate_explanation(question_text, selected, correct, options)
+    # When the client tells us which session question this is, trust the bank over the payload
+    q = None
+    quiz = current_quiz_session(language, data.get("token"))
+    if quiz is not None and data.get("index") is not None:
+        index = int(data["index"])
+        q = question_repo.get(language, quiz.question_id(index))
+        if q is not None:
+            question_text, correct, options = q.text, q.answer, list(q.options)
+            attempt_recorder.record_answer(
+                quiz.token, index, len(quiz.question_ids), language, q.id, selected, correct
+            )
+    if q is None:
+        q = question_repo.find_by_text(language, question_text)
+
+    return question_text, selected, correct, options, q.explanation if q else ""
+
+
+def fallback_explanation(selected, correct, options):
+    """Explanation used when the AI fails or returns blank."""
+    return (
+        f"1. Why the correct answer is correct:\n"
+        f"- The correct answer is **{correct}**.\n\n"
+        f"2. For each incorrect option, explain why it is wrong:\n"
+        + "\n".join([f"- **{opt}**: Incorrect option." for opt in options if opt != correct])
+        + "\n\n"
+        f"3. Why the user's selected answer may be incorrect:\n"
+        f"- You selected **{selected}**, but the correct answer is **{correct}**."
+        if selected != correct else
+        f"3. Why the user's selected answer may be incorrect:\n"
+        f"- Your answer is correct!"
+    )
+
+
+@app.route("/quiz/<language>/answer", methods=["POST"])
+def answer(language):
+    data = request.get_json()
+    question_text, selected, correct, options, bank_explanation = resolve_answer(language, data)
+
+    explanation, source = explanation_engine.explain(
+        question_text, selected, correct, options, bank_explanation
+    )
 
     # If AI fails or returns blank → create a fallback explanation
     if not explanation or not explanation.strip():
-        explanation = (
-            f"1. Why the correct answer is correct:\n"
-            f"- The correct answer is **{correct}**.\n\n"
-            f"2. For each incorrect option, explain why it is wrong:\n"
-            + "\n".join([f"- **{opt}**: Incorrect option." for opt in options if opt != correct])
-            + "\n\n"
-            f"3. Why the user's selected answer may be incorrect:\n"
-            f"- You selected **{selected}**, but the correct answer is **{correct}**."
-            if selected != correct else
-            f"3. Why the user's selected answer may be incorrect:\n"
-            f"- Your answer is correct!"
-        )
-
-    # Clean formatting
-    explanation = "\n".join([line.lstrip() for line in explanation.splitlines()])
+        explanation = fallback_explanation(selected, correct, options)
+        source = "fallback"
 
+    # Engine output is already cleaned (clean_explanation / bundled_explanation)
     return jsonify({
         "correct": correct,
         "selected": selected,
         "explanation": explanation,
+        "source": source,
         "feedback_msg": "Correct!" if selected == correct else "Incorrect!"
     })
 
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route("/quiz/<language>/answer/stream", methods=["POST"])
+def answer_stream(language):
+    """
+    Server-Sent Events version of /answer:
+    - "verdict" is sent immediately
+    - "delta" events carry the explanation as the model writes it
+    - "done" carries the full, cleaned explanation
+    """
+    data = request.get_json()
+    question_text, selected, correct, options, bank_explanation = resolve_answer(language, data)
+
+    def events():
+        yield sse_event("verdict", {
+            "correct": correct,
+            "selected": selected,
+            "feedback_msg": "Correct!" if selected == correct else "Incorrect!"
+        })
+
+        # Cache, then one shared upstream stream per distinct answer (see ExplanationEngine.stream)
+        explanation = None
+        for event in explanation_engine.stream(question_text, selected, correct, options, bank_explanation):
+            if event[0] == "delta":
+                if event[1]:
+                    yield sse_event("delta", event[1])
+            else:
+                explanation = event[1]
+
+        if not explanation:
+            explanation = clean_explanation(fallback_explanation(selected, correct, options))
+
+        yield sse_event("done", {"explanation": explanation})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 # ---------------------------
 # Study Pages
 # ---------------------------
 @app.route("/study/python")
+@page_cache.cached
 def study_py():
     return render_template("study/python_study.html")
 
 @app.route("/study/cpp")
+@page_cache.cached
 def study_cpp():
     return render_template("study/cpp_study.html")
 
 @app.route("/study/java")
+@page_cache.cached
 def study_java():
     return render_template("study/java_study.html")
 
+page_cache.warm(app)
+
 # ---------------------------
 # Trigger Error
 # ---------------------------
@@ -388,4 +809,9 @@ def trigger_error():
 # Start App
 # ---------------------------
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
\ No newline at end of file
+    if os.environ.get("QUIZ_LISTEN_FD"):
+        # Started by server.py's supervisor on a socket it owns
+        from server import serve_inherited
+        serve_inherited(app)
+    else:
+        app.run(host="0.0.0.0", port=5001, debug=True, threaded=True)
\ No newline at end of file
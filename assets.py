@@ -0,0 +1,177 @@
+"""
+Fingerprinted, precompressed static assets.
+
+Build step (run by the Dockerfile, or by hand after editing static/):
+
+    python assets.py
+
+copies every file in static/ to static/dist/<name>.<hash><ext>, writes .gz
+(and .br when the `brotli` package is installed) next to the compressible
+ones, and records the mapping in static/dist/manifest.json.
+
+At runtime `init_assets(app)` adds an `asset_url(filename)` template helper
+that returns the hashed URL, and an /assets/<name> route that serves the
+best precompressed variant the browser accepts with a one-year immutable
+Cache-Control. A changed file gets a new name, so browsers never need to
+revalidate. Without a build, asset_url falls back to the plain /static URL.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import threading
+
+from flask import abort, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # optional: gzip variants only
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_NAME = "dist"
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map")
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def hashed_name(relative_path, digest):
+    root, ext = os.path.splitext(relative_path)
+    return f"{root}.{digest[:12]}{ext}"
+
+
+def _write_if_smaller(path, data, original_size):
+    # A "compressed" file that isn't smaller just costs a decode
+    if len(data) < original_size:
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def build(static_dir=STATIC_DIR):
+    """Write fingerprinted copies and compressed variants; returns the manifest."""
+    dist_dir = os.path.join(static_dir, DIST_NAME)
+    os.makedirs(dist_dir, exist_ok=True)
+
+    manifest = {}
+    outputs = {MANIFEST_NAME}
+    for dirpath, dirnames, filenames in os.walk(static_dir):
+        if os.path.abspath(dirpath) == os.path.abspath(static_dir):
+            dirnames[:] = [d for d in dirnames if d != DIST_NAME]
+        for filename in filenames:
+            source = os.path.join(dirpath, filename)
+            relative = os.path.relpath(source, static_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+
+            name = hashed_name(relative, hashlib.sha256(data).hexdigest())
+            target = os.path.join(dist_dir, name)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if not os.path.exists(target):
+                shutil.copyfile(source, target)
+            outputs.add(name)
+
+            if relative.endswith(COMPRESSIBLE):
+                if not os.path.exists(target + ".gz"):
+                    _write_if_smaller(target + ".gz", gzip.compress(data, compresslevel=9, mtime=0), len(data))
+                outputs.add(name + ".gz")
+                if brotli is not None:
+                    if not os.path.exists(target + ".br"):
+                        _write_if_smaller(target + ".br", brotli.compress(data, quality=11), len(data))
+                    outputs.add(name + ".br")
+            manifest[relative] = name
+
+    # Drop outputs of files that changed or were removed
+    for dirpath, _, filenames in os.walk(dist_dir):
+        for filename in filenames:
+            relative = os.path.relpath(os.path.join(dirpath, filename), dist_dir).replace(os.sep, "/")
+            if relative not in outputs:
+                os.unlink(os.path.join(dirpath, filename))
+
+    tmp_path = os.path.join(dist_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, os.path.join(dist_dir, MANIFEST_NAME))
+    return manifest
+
+
+class AssetManifest:
+    """Hashed names from manifest.json, re-read when the build rewrites it."""
+
+    def __init__(self, static_dir=STATIC_DIR):
+        self.dist_dir = os.path.join(static_dir, DIST_NAME)
+        self.path = os.path.join(self.dist_dir, MANIFEST_NAME)
+        self._mtime = None
+        self._names = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return {}
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    try:
+                        with open(self.path) as f:
+                            self._names = json.load(f)
+                    except (OSError, ValueError):
+                        self._names = {}
+                    self._mtime = mtime
+        return self._names
+
+    def url(self, filename):
+        hashed = self.names().get(filename)
+        if hashed is None:
+            return url_for("static", filename=filename)
+        return url_for("assets", filename=hashed)
+
+
+def init_assets(app, static_dir=STATIC_DIR):
+    manifest = AssetManifest(static_dir)
+    app.jinja_env.globals["asset_url"] = manifest.url
+
+    @app.route("/assets/<path:filename>")
+    def assets(filename):
+        path = os.path.realpath(os.path.join(manifest.dist_dir, filename))
+        if not path.startswith(os.path.realpath(manifest.dist_dir) + os.sep) or not os.path.isfile(path):
+            abort(404)
+        if filename == MANIFEST_NAME:
+            # Changes on every build, so it must not get the immutable headers
+            abort(404)
+
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        accepted = request.headers.get("Accept-Encoding", "")
+        encoding = None
+        for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if candidate in accepted and os.path.isfile(path + suffix):
+                path, encoding = path + suffix, candidate
+                break
+
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=True)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint and precompress static assets.")
+    parser.add_argument("--static-dir", default=STATIC_DIR)
+    args = parser.parse_args()
+
+    manifest = build(args.static_dir)
+    for source, name in sorted(manifest.items()):
+        print(f"{source} -> {DIST_NAME}/{name}")
+    if brotli is None:
+        print("brotli not installed: wrote gzip variants only")
+
+
+if __name__ == "__main__":
+    main()
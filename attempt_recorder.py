@@ -0,0 +1,203 @@
+"""
+Write-behind recorder for quiz answers and attempts.
+
+/answer only appends an event to an in-memory buffer. A background thread
+writes the buffer in one transaction when it reaches `flush_size` events or
+every `flush_interval` seconds, and turns completed sessions into QuizAttempt
+rows. close() drains the buffer on shutdown.
+
+When a batch fails, its events are written one by one so a single bad row
+only holds back itself. An event that keeps failing is dropped (and logged)
+after `max_retries` flushes, and the buffer never grows past `max_buffer`.
+"""
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import Integer, cast, func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+logger = logging.getLogger(__name__)
+
+
+class AttemptRecorder:
+    def __init__(self, app, db, answer_model, attempt_model, flush_size=100, flush_interval=2.0,
+                 max_retries=5, max_buffer=10000):
+        self.app = app
+        self.db = db
+        self.answer_model = answer_model
+        self.attempt_model = attempt_model
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.max_buffer = max_buffer
+
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._pid = None
+
+        self.flushed_events = 0
+        self.flushed_attempts = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+
+    # ---------------------------
+    # Producer side
+    # ---------------------------
+    def _ensure_thread(self):
+        # Workers fork after app.py is imported, so start the thread in the process that records
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._buffer = []
+            self._thread = threading.Thread(target=self._run, name="attempt-recorder", daemon=True)
+            self._thread.start()
+
+    def record_answer(self, session_token, question_index, total_questions, language,
+                      question_id, selected, correct):
+        self._ensure_thread()
+        event = {
+            "session_token": session_token,
+            "question_index": question_index,
+            "total_questions": total_questions,
+            "language": language,
+            "question_id": question_id,
+            "selected": selected,
+            "correct_answer": correct,
+            "is_correct": selected == correct,
+            "created_at": time.time(),
+        }
+        with self._lock:
+            if len(self._buffer) >= self.max_buffer:
+                # The database has been failing for a while; don't grow without bound
+                self.dropped += 1
+                return
+            # (event, failed writes so far)
+            self._buffer.append((event, 0))
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    # ---------------------------
+    # Consumer side
+    # ---------------------------
+    def _run(self):
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch:
+            return 0
+
+        try:
+            with self.app.app_context():
+                self._write([event for event, _ in batch])
+            written = len(batch)
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Failed to write {len(batch)} quiz events, retrying one by one: {e}")
+            written = self._write_each(batch)
+
+        self.flushes += 1
+        self.flushed_events += written
+        return written
+
+    def _write_each(self, batch):
+        """Write events separately; put the ones that fail back for the next flush, up to max_retries."""
+        written = 0
+        retry = []
+        for event, tries in batch:
+            try:
+                with self.app.app_context():
+                    self._write([event])
+                written += 1
+            except Exception as e:
+                if tries + 1 >= self.max_retries:
+                    self.dropped += 1
+                    logger.error(f"Dropping quiz event after {tries + 1} failed writes: {event!r}: {e}")
+                else:
+                    retry.append((event, tries + 1))
+        if retry:
+            with self._lock:
+                self._buffer[:0] = retry
+                overflow = len(self._buffer) - self.max_buffer
+                if overflow > 0:
+                    del self._buffer[:overflow]
+                    self.dropped += overflow
+        return written
+
+    def _answered(self, session, token):
+        Answer = self.answer_model
+        return session.execute(
+            select(func.count(Answer.id), func.coalesce(func.sum(cast(Answer.is_correct, Integer)), 0))
+            .where(Answer.session_token == token)
+        ).one()
+
+    def _write(self, batch):
+        """Insert a batch of answers in one transaction and close out finished sessions."""
+        session = self.db.session
+        tokens = {e["session_token"]: e for e in batch}
+        try:
+            before = {token: self._answered(session, token)[0] for token in tokens}
+
+            # The unique (session_token, question_index) constraint drops re-submitted answers
+            session.execute(
+                sqlite_insert(self.answer_model.__table__).on_conflict_do_nothing(),
+                batch,
+            )
+
+            attempts = []
+            for token, event in tokens.items():
+                count, score = self._answered(session, token)
+                total = event["total_questions"]
+                if before[token] < total <= count:
+                    attempts.append({
+                        "score": int(score),
+                        "total_questions": total,
+                        "language": event["language"],
+                    })
+            if attempts:
+                session.execute(self.attempt_model.__table__.insert(), attempts)
+
+            session.commit()
+            self.flushed_attempts += len(attempts)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.remove()
+
+    # ---------------------------
+    # Shutdown
+    # ---------------------------
+    def close(self, timeout=10.0):
+        """Stop the thread and write whatever is still buffered."""
+        self._stopped = True
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "buffered": buffered,
+            "flushes": self.flushes,
+            "flushed_events": self.flushed_events,
+            "flushed_attempts": self.flushed_attempts,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
@@ -1,13 +1,16 @@
 from flask import Flask, render_template
 import os
-import subprocess
 import time
+import urllib.request
+
+from log_reader import tail_lines
+from metrics import parse_prometheus
 
 app = Flask(__name__)
 
 ERROR_LOG = "error.log"
 AUTO_MAINTAIN_LOG = "auto_maintain.log"
-APP_FILE = "app.py"
+METRICS_URL = os.environ.get("QUIZ_METRICS_URL", "http://127.0.0.1:5001/metrics")
 
 # ---------------------------
 # Helper Functions
@@ -15,30 +18,33 @@ APP_FILE = "app.py"
 def read_file_tail(file_path, num_lines=50):
     if not os.path.exists(file_path):
         return ["File not found."]
-    with open(file_path, "r") as f:
-        lines = f.readlines()
-    return lines[-num_lines:]
+    return tail_lines(file_path, num_lines)
 
-def flask_status():
-    """Check if Flask is running."""
+def app_metrics():
+    """Samples from the app's /metrics endpoint, or None if it doesn't answer."""
     try:
-        result = subprocess.run(
-            ["pgrep", "-f", APP_FILE], capture_output=True, text=True
-        )
-        pids = result.stdout.strip().split("\n")
-        pids = [pid for pid in pids if pid]
-        if pids:
-            return True, pids
-        return False, []
-    except Exception:
+        with urllib.request.urlopen(METRICS_URL, timeout=2) as response:
+            return parse_prometheus(response.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def flask_status(samples):
+    """Running if the app answered and reports live workers; their PIDs come from the heartbeat gauge."""
+    if not samples:
         return False, []
+    pids = [labels["pid"] for name, labels, _ in samples if name == "quiz_worker_heartbeat_age_seconds"]
+    return bool(pids), pids
+
+def metric_total(samples, name):
+    return sum(value for sample_name, _, value in samples or [] if sample_name == name)
 
 # ---------------------------
 # Routes
 # ---------------------------
 @app.route("/")
 def dashboard():
-    running, pids = flask_status()
+    samples = app_metrics()
+    running, pids = flask_status(samples)
     errors = read_file_tail(ERROR_LOG, 20)
     auto_logs = read_file_tail(AUTO_MAINTAIN_LOG, 20)
     return render_template(
@@ -46,7 +52,10 @@ def dashboard():
         running=running,
         pids=pids,
         errors=errors,
-        auto_logs=auto_logs
+        auto_logs=auto_logs,
+        requests_total=metric_total(samples, "quiz_http_requests_total"),
+        model_errors=metric_total(samples, "quiz_model_errors_total"),
+        cache_hit_ratio=metric_total(samples, "quiz_explanation_cache_hit_ratio"),
     )
 
 # ---------------------------
@@ -1,10 +1,16 @@
-import subprocess
-import time
+import datetime
 import os
-import difflib
 import shutil
 import logging
 from openai import OpenAI
+from model_gateway import ModelGateway
+from log_reader import LogFollower
+from logging_setup import parse_log_line
+from error_fingerprints import FingerprintIndex, split_tracebacks
+from file_watcher import FileWatcher
+from server import RollingSupervisor
+from patch_pipeline import PatchPipeline
+from state_store import StateStore
 from api import API_KEY
 import smtplib
 from email.mime.text import MIMEText
@@ -17,8 +23,13 @@ FLASK_COMMAND = ["python3", "app.py"]   # Command to start Flask
 APP_FILE = "app.py"
 BACKUP_FILE = "app_backup.py"
 ERROR_LOG = "error.log"
-CHECK_INTERVAL = 60  # seconds between checks
+CHECK_INTERVAL = 60  # safety-net re-check when no file events arrive
 AUTO_MAINTAIN_LOG = "auto_maintain.log"
+# Where the log follower left off; kept out of the watched directory so saving it isn't an event
+ERROR_LOG_OFFSET = "instance/error_log.offset"
+LEGACY_ERROR_LOG_OFFSET = ".error_log.offset"
+FINGERPRINT_DB = "instance/error_fingerprints.db"
+STATE_DB = "instance/auto_maintain_state.db"  # patch/restart history for the dashboard
 
 # Email setup
 email_sender = EMAIL_SENDER  
@@ -27,8 +38,11 @@ email_receiver = EMAIL_RECEIVER
 SMTP_SERVER = "smtp.gmail.com"
 SMTP_PORT = 587
 
-# OpenAI client
-client = OpenAI(api_key=API_KEY)
+# OpenAI client (behind the shared gateway: deadline, retries, circuit breaker)
+client = ModelGateway(OpenAI(api_key=API_KEY, max_retries=0), max_in_flight=2, timeout=60)
+
+# Patches are applied and smoke-tested in a scratch copy of this directory first
+patch_pipeline = PatchPipeline(os.path.dirname(os.path.abspath(__file__)))
 
 # ---------------------------
 # Logging Setup
@@ -58,19 +72,34 @@ def send_email(subject, body):
     except Exception as e:
         logging.error(f"Failed to send email: {e}")
 
+def record_time(record):
+    """Epoch seconds of a JSON log record, or None if it has no usable timestamp."""
+    try:
+        return datetime.datetime.fromisoformat(record["ts"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
 def start_flask():
-    """Start the Flask application."""
-    proc = subprocess.Popen(FLASK_COMMAND)
-    logging.info(f"Flask started with PID {proc.pid}")
-    return proc
-
-def restart_flask(proc):
-    """Restart Flask process."""
-    if proc.poll() is None:
-        proc.terminate()
-        proc.wait()
-        logging.info("Flask terminated.")
-    return start_flask()
+    """Start the Flask application behind a supervisor that owns the port."""
+    supervisor = RollingSupervisor(FLASK_COMMAND)
+    supervisor.start()
+    logging.info(f"Flask started with PID {supervisor.process.pid}")
+    return supervisor
+
+def restart_flask(supervisor):
+    """Swap in a new Flask process; the old one drains before it exits."""
+    if supervisor.rolling_restart():
+        logging.info(f"Flask restarted with PID {supervisor.process.pid}")
+        return True
+    logging.warning("New Flask process failed its health check; old one kept serving.")
+    return False
+
+def app_changed_since_start(supervisor):
+    """True if APP_FILE was modified after the running process started."""
+    try:
+        return os.path.getmtime(APP_FILE) > supervisor.serving_since
+    except OSError:
+        return False
 
 def generate_patch(code, recent_errors):
     """Generate minimal unified diff patch using OpenAI."""
@@ -113,12 +142,12 @@ Use this format ONLY:
         return None
 
 def apply_patch(patch_text, file_path):
-    """Apply patch safely and restore backup on failure."""
+    """Validate the patch in a scratch copy and swap it in only if every check passes."""
     if not patch_text:
         logging.info("No patch to apply.")
         return False
 
-    # Backup original file
+    # Keep the last known-good copy around for manual rollback
     try:
         shutil.copy(file_path, BACKUP_FILE)
         logging.info(f"Backup created at {BACKUP_FILE}")
@@ -127,46 +156,61 @@ def apply_patch(patch_text, file_path):
         send_email("Auto-Maintain Error", f"Failed to create backup: {e}")
         return False
 
-    try:
-        with open(file_path, "r") as f:
-            original = f.readlines()
-        new_lines = difflib.restore(patch_text.splitlines(), 1)
-        with open(file_path, "w") as f:
-            f.writelines(new_lines)
-        logging.info(f"Patch applied to {file_path}")
+    result = patch_pipeline.run(patch_text, target=file_path)
+    if not result.ok:
+        logging.error(f"Patch rejected at {result.stage}: {result.detail}")
         send_email(
-            "Auto-Maintain Patch Applied",
-            f"A patch was applied to {file_path}.\n\nPatch:\n{patch_text}"
+            "Auto-Maintain Patch Rejected",
+            f"A patch for {file_path} failed at {result.stage}:\n{result.detail}\n\nPatch:\n{patch_text}"
         )
-        return True
-    except Exception as e:
-        logging.error(f"Error applying patch: {e}")
-        send_email("Auto-Maintain Error", f"Failed to apply patch: {e}")
-        # Restore backup
-        try:
-            shutil.copy(BACKUP_FILE, file_path)
-            logging.info("Backup restored after failed patch.")
-        except Exception as restore_e:
-            logging.error(f"Failed to restore backup: {restore_e}")
-            send_email("Auto-Maintain Error", f"Failed to restore backup: {restore_e}")
         return False
 
+    logging.info(f"Patch applied to {file_path}")
+    send_email(
+        "Auto-Maintain Patch Applied",
+        f"A patch was applied to {file_path}.\n\nPatch:\n{patch_text}"
+    )
+    return True
+
 # ---------------------------
 # Main Loop
 # ---------------------------
 if __name__ == "__main__":
-    flask_proc = start_flask()
-    restart_count = 0
+    flask_supervisor = start_flask()
+    state = StateStore(STATE_DB, legacy_json="auto_maintain_state.json")
+    if os.path.exists(LEGACY_ERROR_LOG_OFFSET) and not os.path.exists(ERROR_LOG_OFFSET):
+        os.makedirs(os.path.dirname(ERROR_LOG_OFFSET), exist_ok=True)
+        os.replace(LEGACY_ERROR_LOG_OFFSET, ERROR_LOG_OFFSET)
+    error_follower = LogFollower(ERROR_LOG, ERROR_LOG_OFFSET)
+    fingerprints = FingerprintIndex(FINGERPRINT_DB)
+    # Wake on writes to the log or the app code instead of sleeping a fixed interval
+    watcher = FileWatcher([ERROR_LOG, APP_FILE])
+    logging.info(f"Watching {ERROR_LOG} and {APP_FILE} ({watcher.mode})")
 
     while True:
         try:
-            recent_errors = ""
-            if os.path.exists(ERROR_LOG):
-                with open(ERROR_LOG, "r") as f:
-                    recent_errors = f.read()[-5000:]
-
-            if "Traceback" in recent_errors:
+            # Only the lines written since the last check; error.log is JSON lines
+            new_lines = error_follower.read_new()
+            records = [parse_log_line(line) for line in new_lines]
+            # Plain-text lines from before the JSON logging change
+            legacy_text = "".join(line for line, r in zip(new_lines, records) if r is None)
+
+            occurrences = [
+                (r["traceback"], f"{r.get('ts')} {r.get('route', '')} {r['message']}\n", record_time(r))
+                for r in records if r and r.get("traceback")
+            ] + [(tb, "", None) for tb in split_tracebacks(legacy_text)]
+
+            # Act only on errors we haven't seen before, or that came back after a fix
+            actionable = {}
+            for tb_text, header, seen_at in occurrences:
+                signature, status = fingerprints.observe(tb_text, seen_at)
+                if status in ("new", "regression") and signature not in actionable:
+                    logging.info(f"{status.capitalize()} error signature {signature}")
+                    actionable[signature] = header + tb_text
+
+            if actionable:
                 logging.info("Errors detected in logs, generating patch...")
+                recent_errors = "".join(actionable.values())[-5000:]
 
                 # Read the app code
                 with open(APP_FILE, "r") as f:
@@ -177,9 +221,12 @@ if __name__ == "__main__":
 
                 # Apply patch and restart Flask if needed
                 if apply_patch(patch, APP_FILE):
+                    state.append("patch", file=APP_FILE, patch=patch, source="auto_maintain",
+                                 signatures=list(actionable))
                     logging.info("Restarting Flask app after patch.")
-                    flask_proc = restart_flask(flask_proc)
-                    restart_count += 1
+                    if restart_flask(flask_supervisor):
+                        state.record_restart(reason="patch")
+                        fingerprints.mark_resolved(actionable)
                 else:
                     logging.warning("Patch not applied or invalid. Skipping restart.")
 
@@ -187,4 +234,9 @@ if __name__ == "__main__":
             logging.error(f"Exception in auto-maintain loop: {e}")
             send_email("Auto-Maintain Exception", str(e))
 
-        time.sleep(CHECK_INTERVAL)
\ No newline at end of file
+        changed = watcher.wait(timeout=CHECK_INTERVAL)
+        if os.path.abspath(APP_FILE) in changed and app_changed_since_start(flask_supervisor):
+            # Edited outside this loop: roll it out without dropping connections
+            logging.info(f"{APP_FILE} changed on disk, rolling restart.")
+            if restart_flask(flask_supervisor):
+                state.record_restart(reason="file changed")
\ No newline at end of file
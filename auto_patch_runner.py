@@ -1,43 +1,30 @@
 import os
-import json
 import time
 import logging
 from openai import OpenAI
 from pathlib import Path
+from model_gateway import ModelGateway
+from log_reader import tail_lines
+from state_store import StateStore
 
 # Configure OpenAI client
 api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     raise RuntimeError("OPENAI_API_KEY not found in environment!")
-client = OpenAI(api_key=api_key)
+client = ModelGateway(OpenAI(api_key=api_key, max_retries=0), max_in_flight=2, timeout=60)
 
 # Paths
 APP_DIR = Path("/app")
 ERROR_LOG = APP_DIR / "error.log"
-STATE_FILE = APP_DIR / "auto_maintain_state.json"
+STATE_DB = APP_DIR / "instance" / "auto_maintain_state.db"
+LEGACY_STATE_FILE = APP_DIR / "auto_maintain_state.json"
 
 # Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("auto_patch_runner")
 
-def load_state():
-    if STATE_FILE.exists():
-        try:
-            return json.load(open(STATE_FILE))
-        except:
-            return {"patches": []}
-    return {"patches": []}
-
-def save_state(state):
-    with open(STATE_FILE, "w") as f:
-        json.dump(state, f, indent=2)
-
 def read_last_errors(n=50):
-    if ERROR_LOG.exists():
-        with open(ERROR_LOG) as f:
-            lines = f.readlines()
-            return lines[-n:]
-    return []
+    return tail_lines(ERROR_LOG, n)
 
 def generate_patch(code: str, errors: str) -> str:
     prompt = f"""
@@ -65,7 +52,7 @@ Provide a **unified diff** patch to fix the errors. Do NOT include explanations.
 def main():
     logger.info("Starting auto-patch runner...")
 
-    state = load_state()
+    state = StateStore(str(STATE_DB), legacy_json=str(LEGACY_STATE_FILE))
     # Read current app code
     app_files = [APP_DIR / "app.py"]  # add other files if needed
 
@@ -85,13 +72,9 @@ def main():
             # Optionally apply here using `patch` command:
             # os.system(f"patch {file_path} < {patch_file}")
 
-            state["patches"].append({
-                "file": str(file_path),
-                "time": time.strftime('%Y-%m-%d %H:%M:%S'),
-                "patch_file": str(patch_file)
-            })
+            state.append("patch", file=str(file_path), patch=patch, patch_file=str(patch_file),
+                         source="auto_patch_runner")
 
-    save_state(state)
     logger.info("Auto-patch runner finished.")
 
 if __name__ == "__main__":
@@ -0,0 +1 @@
+"""Load tests and micro-benchmarks. Run the modules from the repo root: python -m benchmarks.<name>"""
@@ -0,0 +1,140 @@
+"""
+Shared pieces of the benchmark scripts: percentiles, memory readings and
+the JSON report format that compare.py reads.
+
+Every report looks like
+
+    {
+      "kind": "loadgen" | "micro",
+      "created": "2026-01-01 12:00:00",
+      "commit": "abc1234", "dirty": false, "python": "3.11.9",
+      "config": {...},                      # the arguments of the run
+      "rss_kb": {"server_peak": ..., ...},  # lower is better
+      "results": {name: {metric: value}}    # see LOWER_IS_BETTER / HIGHER_IS_BETTER
+    }
+"""
+import json
+import os
+import platform
+import resource
+import subprocess
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+
+# Metrics compare.py checks; the rest of a result (mean, max, counts) is informational
+LOWER_IS_BETTER = {"p50_ms", "p95_ms", "p99_ms", "error_rate", "min_us", "median_us"}
+HIGHER_IS_BETTER = {"rps"}
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (None when empty)."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))  # ceil without floats
+    return sorted_values[int(rank) - 1]
+
+
+def latency_summary(seconds, duration=None):
+    """p50/p95/p99/mean/max in milliseconds for a list of latencies in seconds."""
+    values = sorted(seconds)
+    summary = {
+        "count": len(values),
+        "p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None,
+    }
+    if values:
+        summary.update(
+            p50_ms=round(percentile(values, 50) * 1000, 3),
+            p95_ms=round(percentile(values, 95) * 1000, 3),
+            p99_ms=round(percentile(values, 99) * 1000, 3),
+            mean_ms=round(sum(values) / len(values) * 1000, 3),
+            max_ms=round(values[-1] * 1000, 3),
+        )
+    if duration:
+        summary["rps"] = round(len(values) / duration, 2)
+    return summary
+
+
+# ---------------------------
+# Memory
+# ---------------------------
+def _children(pid):
+    children = []
+    try:
+        for tid in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+    except OSError:
+        pass
+    return children
+
+
+def rss_kb(pid, include_children=True):
+    """Resident memory of a process (plus its children, e.g. gunicorn workers) in KiB.
+    Linux only; None where /proc isn't available."""
+    pids = [pid]
+    if include_children:
+        i = 0
+        while i < len(pids):
+            pids.extend(_children(pids[i]))
+            i += 1
+
+    total = 0
+    found = False
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        found = True
+                        break
+        except OSError:
+            continue
+    return total if found else None
+
+
+def own_peak_rss_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux but bytes on macOS
+    return peak // 1024 if platform.system() == "Darwin" else peak
+
+
+# ---------------------------
+# Reports
+# ---------------------------
+def _git(*args):
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def new_report(kind, config):
+    return {
+        "kind": kind,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": _git("rev-parse", "--short", "HEAD") or None,
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": config,
+        "rss_kb": {},
+        "results": {},
+    }
+
+
+def write_report(report, path=None):
+    """Write the report as JSON (default: benchmarks/results/<kind>-<commit>-<time>.json)."""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(RESULTS_DIR, f"{report['kind']}-{report['commit'] or 'nogit'}-{stamp}.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return path
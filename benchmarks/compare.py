@@ -0,0 +1,82 @@
+"""
+Compare two benchmark reports (same kind) and flag regressions.
+
+    python -m benchmarks.compare benchmarks/results/micro-abc1234-....json benchmarks/results/micro-def5678-....json
+
+Prints every metric both reports have with its relative change. A metric is
+a regression when it got worse by more than --threshold (10% by default);
+the exit status is 1 if there is any, so the command can gate CI.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.common import HIGHER_IS_BETTER, LOWER_IS_BETTER
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def rows(base, head):
+    """(name, metric, old, new) for every metric both reports share."""
+    for name in base["results"]:
+        if name not in head["results"]:
+            continue
+        old_metrics, new_metrics = base["results"][name], head["results"][name]
+        for metric in sorted(old_metrics):
+            if metric not in LOWER_IS_BETTER and metric not in HIGHER_IS_BETTER:
+                continue
+            yield name, metric, old_metrics[metric], new_metrics.get(metric)
+    for name in sorted(base.get("rss_kb", {})):
+        yield "rss_kb", name, base["rss_kb"][name], head.get("rss_kb", {}).get(name)
+
+
+def compare(base, head, threshold):
+    """[(name, metric, old, new, change or None, regressed)]"""
+    out = []
+    for name, metric, old, new in rows(base, head):
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else None
+        if change is None:
+            regressed = False
+        elif metric in HIGHER_IS_BETTER:
+            regressed = change < -threshold
+        else:
+            # Latencies, error rates and memory: lower is better
+            regressed = change > threshold
+        out.append((name, metric, old, new, change, regressed))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports.")
+    parser.add_argument("base", help="report of the baseline (e.g. main)")
+    parser.add_argument("head", help="report of the change being measured")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative change that counts as a regression")
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    if base.get("kind") != head.get("kind"):
+        sys.exit(f"Can't compare a {base.get('kind')} report with a {head.get('kind')} report")
+    print(f"base {base.get('commit')} ({base.get('created')})  vs  head {head.get('commit')} ({head.get('created')})")
+    if base.get("config") != head.get("config"):
+        print("warning: the runs used different settings; compare with care")
+
+    regressions = 0
+    print(f"{'name':<28} {'metric':<14} {'base':>12} {'head':>12} {'change':>9}")
+    for name, metric, old, new, change, regressed in compare(base, head, args.threshold):
+        mark = "  REGRESSION" if regressed else ""
+        change_text = f"{change:+.1%}" if change is not None else "n/a"
+        print(f"{name:<28} {metric:<14} {old:>12} {new:>12} {change_text:>9}{mark}")
+        regressions += regressed
+
+    if regressions:
+        print(f"{regressions} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+Local stand-in for the OpenAI chat completions API, for load tests that
+shouldn't spend money or depend on upstream latency.
+
+    python -m benchmarks.fake_openai --port 8089 --latency 0.8 --jitter 0.3 --error-rate 0.02
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake gunicorn -c gunicorn.conf.py app:app
+
+POST /v1/chat/completions answers after `latency` ± `jitter` seconds with an
+explanation-shaped text (indented lines, like the real model often sends).
+With "stream": true the same text arrives as server-sent event chunks, the
+first after `latency` and the rest `chunk_delay` apart.
+
+A fraction of requests fails on purpose: `error_rate` with a 500,
+`rate_limit_rate` with a 429 and Retry-After. The settings can be changed
+while a test runs:
+
+    curl -X POST localhost:8089/_fake/config -d '{"error_rate": 0.5}'
+    curl localhost:8089/_fake/stats
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULTS = {
+    "latency": 0.5,
+    "jitter": 0.0,
+    "chunk_delay": 0.02,
+    "chunks": 40,
+    "error_rate": 0.0,
+    "rate_limit_rate": 0.0,
+}
+
+EXPLANATION = """
+    1. Why the correct answer is correct:
+    The correct option follows directly from how the language evaluates the expression.
+    2. For each incorrect option, explain why it is wrong:
+    - The first distractor confuses the operator with string concatenation.
+    - The second distractor assumes an exception that is never raised.
+    - The third distractor mixes up the return value with the printed output.
+    3. Why the user's selected answer may be incorrect:
+    It matches a common misconception about evaluation order.
+"""
+
+
+class FakeState:
+    def __init__(self, config, seed=None):
+        self.config = dict(DEFAULTS, **config)
+        self.rng = random.Random(seed)
+        self.counts = {"requests": 0, "streams": 0, "errors": 0, "rate_limited": 0}
+        self.lock = threading.Lock()
+
+    def decide(self):
+        """(status, delay) for the next request."""
+        with self.lock:
+            cfg = self.config
+            self.counts["requests"] += 1
+            roll = self.rng.random()
+            delay = max(0.0, cfg["latency"] + self.rng.uniform(-cfg["jitter"], cfg["jitter"]))
+            if roll < cfg["error_rate"]:
+                self.counts["errors"] += 1
+                return 500, delay
+            if roll < cfg["error_rate"] + cfg["rate_limit_rate"]:
+                self.counts["rate_limited"] += 1
+                return 429, 0.0
+            return 200, delay
+
+
+def split_text(text, pieces):
+    size = max(1, -(-len(text) // pieces))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status, payload, headers=()):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        if self.path == "/_fake/stats":
+            with self.state.lock:
+                self._json(200, {"config": self.state.config, "counts": self.state.counts})
+        else:
+            self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if self.path == "/_fake/config":
+            update = self._read_json()
+            with self.state.lock:
+                self.state.config.update({k: float(v) for k, v in update.items() if k in DEFAULTS})
+                self._json(200, self.state.config)
+            return
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._json(404, {"error": {"message": "not found"}})
+            return
+
+        request = self._read_json()
+        status, delay = self.state.decide()
+        time.sleep(delay)
+        if status == 429:
+            self._json(429, {"error": {"message": "Rate limit reached (injected)", "type": "rate_limit_error"}},
+                       headers=[("Retry-After", "1")])
+            return
+        if status != 200:
+            self._json(status, {"error": {"message": "Internal error (injected)", "type": "server_error"}})
+            return
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = request.get("model", "gpt-4o")
+        if request.get("stream"):
+            self._stream(completion_id, model)
+        else:
+            self._json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": EXPLANATION},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 120, "completion_tokens": 160, "total_tokens": 280},
+            })
+
+    def _stream(self, completion_id, model):
+        with self.state.lock:
+            self.state.counts["streams"] += 1
+            chunks, chunk_delay = int(self.state.config["chunks"]), self.state.config["chunk_delay"]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(delta, finish_reason=None):
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self._chunk(f"data: {json.dumps(payload)}\n\n")
+
+        event({"role": "assistant", "content": ""})
+        for i, piece in enumerate(split_text(EXPLANATION, chunks)):
+            if i:
+                time.sleep(chunk_delay)
+            event({"content": piece})
+        event({}, "stop")
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+def make_server(host="127.0.0.1", port=8089, seed=None, **config):
+    handler = type("FakeHandler", (Handler,), {"state": FakeState(config, seed)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat completions server for load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=DEFAULTS["latency"], help="seconds before the answer (or first chunk)")
+    parser.add_argument("--jitter", type=float, default=DEFAULTS["jitter"], help="± uniform seconds added to latency")
+    parser.add_argument("--chunks", type=int, default=DEFAULTS["chunks"], help="pieces a streamed answer is split into")
+    parser.add_argument("--chunk-delay", type=float, default=DEFAULTS["chunk_delay"])
+    parser.add_argument("--error-rate", type=float, default=DEFAULTS["error_rate"], help="fraction answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=DEFAULTS["rate_limit_rate"], help="fraction answered with 429")
+    parser.add_argument("--seed", type=int, default=None, help="make latency and failures repeatable")
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port, seed=args.seed,
+        latency=args.latency, jitter=args.jitter, chunks=args.chunks, chunk_delay=args.chunk_delay,
+        error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+    )
+    print(f"Fake OpenAI on http://{args.host}:{args.port}/v1 (OPENAI_BASE_URL)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Open-loop load generator: sends a weighted mix of quiz traffic at a fixed
+request rate and writes a JSON report (see common.py).
+
+    python -m benchmarks.loadgen --url http://127.0.0.1:5001 --rps 50 --duration 60 \\
+        --mix home=2,quiz=1,get_question=4,answer=3 --server-pid $(pgrep -of gunicorn)
+
+Operations:
+
+    home          GET  /
+    study         GET  /study/<language>
+    quiz          GET  /quiz/<language>           (starts a new quiz session)
+    get_question  GET  /quiz/<language>/get_question?i=<n>&token=<t>
+    answer        POST /quiz/<language>/answer    (explanation from cache / model / bank)
+    answer_stream POST /quiz/<language>/answer/stream
+
+Requests are sent on schedule whether or not earlier ones have finished, and
+latency is measured from the scheduled time, so a stalled server shows up
+in the percentiles instead of silently lowering the request rate. Requests
+scheduled during --warmup seconds are sent but left out of the report.
+"""
+import argparse
+import http.client
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.common import latency_summary, new_report, own_peak_rss_kb, rss_kb, write_report
+
+DEFAULT_MIX = "home=2,quiz=1,get_question=4,answer=3"
+TOKEN_PATTERN = re.compile(r'const quizToken = "([^"]+)"')
+
+
+class Client:
+    """Keep-alive HTTP connections, one per thread."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = cls(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method, path, body=None):
+        """(status, body bytes). The whole body is read, so streamed answers are timed in full."""
+        headers = {"Accept-Encoding": "gzip"}
+        if body is not None:
+            body = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        for attempt in (1, 2):
+            conn = self._conn()
+            try:
+                conn.request(method, self.prefix + path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                self._local.conn = None
+                # A kept-alive connection the server already closed: retry once on a fresh one
+                if attempt == 2:
+                    raise
+                continue
+            if response.will_close:
+                conn.close()
+                self._local.conn = None
+            return response.status, data
+
+
+class Workload:
+    def __init__(self, client, languages, sessions, rng):
+        self.client = client
+        self.languages = languages
+        self.rng = rng
+        self.sessions = []  # (language, token, [options per question index])
+        self._lock = threading.Lock()
+        self._prepare(sessions)
+
+    def _start_session(self, language):
+        status, body = self.client.request("GET", f"/quiz/{language}")
+        if status != 200:
+            raise RuntimeError(f"GET /quiz/{language} returned {status}")
+        match = TOKEN_PATTERN.search(body.decode("utf-8", errors="replace"))
+        if not match:
+            raise RuntimeError(f"No quiz token in /quiz/{language}")
+        return match.group(1)
+
+    def _prepare(self, count):
+        """Start quiz sessions up front and learn their options, so answers are valid."""
+        for i in range(count):
+            language = self.languages[i % len(self.languages)]
+            token = self._start_session(language)
+            options = []
+            for index in range(100):
+                status, body = self.client.request(
+                    "GET", f"/quiz/{language}/get_question?" + urlencode({"i": index, "token": token}))
+                data = json.loads(body)
+                if status != 200 or data.get("finished"):
+                    break
+                options.append(data["options"])
+            if options:
+                self.sessions.append((language, token, options))
+        if not self.sessions:
+            raise RuntimeError("Could not start any quiz sessions")
+
+    def _pick(self):
+        with self._lock:
+            language, token, options = self.rng.choice(self.sessions)
+            index = self.rng.randrange(len(options))
+            selected = self.rng.choice(options[index])
+        return language, token, index, selected
+
+    # ---------------------------
+    # Operations: each returns the HTTP status
+    # ---------------------------
+    def home(self):
+        return self.client.request("GET", "/")[0]
+
+    def study(self):
+        return self.client.request("GET", f"/study/{self.rng.choice(['python', 'cpp', 'java'])}")[0]
+
+    def quiz(self):
+        return self.client.request("GET", f"/quiz/{self.rng.choice(self.languages)}")[0]
+
+    def get_question(self):
+        language, token, index, _ = self._pick()
+        return self.client.request(
+            "GET", f"/quiz/{language}/get_question?" + urlencode({"i": index, "token": token}))[0]
+
+    def answer(self):
+        language, token, index, selected = self._pick()
+        return self.client.request(
+            "POST", f"/quiz/{language}/answer", {"token": token, "index": index, "selected": selected})[0]
+
+    def answer_stream(self):
+        language, token, index, selected = self._pick()
+        return self.client.request(
+            "POST", f"/quiz/{language}/answer/stream", {"token": token, "index": index, "selected": selected})[0]
+
+
+OPERATIONS = ("home", "study", "quiz", "get_question", "answer", "answer_stream")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in filter(None, text.split(",")):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {name!r} (choose from {', '.join(OPERATIONS)})")
+        mix[name] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("the mix needs at least one operation with a positive weight")
+    return mix
+
+
+class RssSampler(threading.Thread):
+    """Samples the server's RSS (with its worker processes) while the test runs."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            value = rss_kb(self.pid)
+            if value is not None:
+                self.samples.append(value)
+            self.stopped.wait(self.interval)
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    client = Client(args.url, args.timeout)
+    workload = Workload(client, args.languages, args.sessions, rng)
+
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+    results = {name: [] for name in names}  # name -> [(latency, ok)]
+    lock = threading.Lock()
+    warmup_end = args.warmup
+    total = args.warmup + args.duration
+
+    def run_one(name, scheduled, measured):
+        try:
+            status = getattr(workload, name)()
+            ok = status < 400
+        except Exception:
+            ok = False
+        latency = time.perf_counter() - scheduled
+        if measured:
+            with lock:
+                results[name].append((latency, ok))
+
+    sampler = RssSampler(args.server_pid) if args.server_pid else None
+    rss_start = rss_kb(args.server_pid) if args.server_pid else None
+    if sampler:
+        sampler.start()
+
+    interval = 1.0 / args.rps
+    late = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        started = time.perf_counter()
+        i = 0
+        while True:
+            offset = i * interval
+            if offset >= total:
+                break
+            scheduled = started + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -interval:
+                late += 1
+            name = rng.choices(names, weights)[0]
+            pool.submit(run_one, name, scheduled, offset >= warmup_end)
+            i += 1
+    elapsed = args.duration
+
+    if sampler:
+        sampler.stopped.set()
+        sampler.join()
+
+    report = new_report("loadgen", {
+        "url": args.url, "rps": args.rps, "duration": args.duration, "warmup": args.warmup,
+        "mix": args.mix, "concurrency": args.concurrency, "sessions": args.sessions,
+        "languages": args.languages, "seed": args.seed,
+    })
+    everything = []
+    errors_total = 0
+    for name, samples in results.items():
+        latencies = [latency for latency, _ in samples]
+        errors = sum(1 for _, ok in samples if not ok)
+        errors_total += errors
+        everything.extend(latencies)
+        summary = latency_summary(latencies, elapsed)
+        summary["errors"] = errors
+        summary["error_rate"] = round(errors / len(samples), 4) if samples else 0.0
+        report["results"][name] = summary
+    summary = latency_summary(everything, elapsed)
+    summary["errors"] = errors_total
+    summary["error_rate"] = round(errors_total / len(everything), 4) if everything else 0.0
+    summary["late_dispatches"] = late
+    report["results"]["all"] = summary
+    report["target_rps"] = args.rps
+    report["achieved_rps"] = summary.get("rps")
+
+    report["rss_kb"]["loadgen_peak"] = own_peak_rss_kb()
+    if sampler and sampler.samples:
+        report["rss_kb"].update(server_start=rss_start, server_peak=max(sampler.samples),
+                                server_end=sampler.samples[-1])
+    return report
+
+
+def print_summary(report):
+    print(f"{'operation':<14} {'count':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for name, r in report["results"].items():
+        if not r["count"]:
+            print(f"{name:<14} {0:>7}")
+            continue
+        print(f"{name:<14} {r['count']:>7} {r['rps']:>8} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['errors']:>7}")
+    for name, value in report["rss_kb"].items():
+        print(f"rss {name}: {value} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive mixed quiz traffic at a target request rate.")
+    parser.add_argument("--url", default="http://127.0.0.1:5001")
+    parser.add_argument("--rps", type=float, default=20.0, help="target requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5.0, help="seconds of traffic before measuring")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f"weighted operations (default {DEFAULT_MIX})")
+    parser.add_argument("--languages", type=lambda s: s.split(","), default=["python", "cpp", "java"])
+    parser.add_argument("--sessions", type=int, default=20, help="quiz sessions started before the test")
+    parser.add_argument("--concurrency", type=int, default=64, help="most requests in flight at once")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--server-pid", type=int, help="sample this process's RSS (children included)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="report path (default benchmarks/results/loadgen-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    report = run(args)
+    print_summary(report)
+    print(f"report: {write_report(report, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
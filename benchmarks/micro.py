@@ -0,0 +1,142 @@
+"""
+Micro-benchmarks for the hot helpers behind the quiz routes, without a
+server or network. Writes a JSON report (see common.py).
+
+    python -m benchmarks.micro                      # everything
+    python -m benchmarks.micro --filter log         # only names containing "log"
+
+Each benchmark is timed like timeit: enough calls per round to take at
+least --min-time seconds, --repeat rounds, and min / median / mean per call
+reported in microseconds.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.common import REPO_ROOT, new_report, own_peak_rss_kb, write_report
+from benchmarks.fake_openai import EXPLANATION, split_text
+from diagnostics_service import log_window
+from explainer import clean_explanation, clean_stream
+from explanation_engine import bundled_explanation
+from log_reader import LogFollower, tail_lines, tail_text
+from question_bank import CompiledBank, build as build_bank
+from question_repository import QuestionBank, QuestionRepository
+
+QUESTIONS_DIR = os.path.join(REPO_ROOT, "questions")
+
+LOG_LINE = "2026-01-01 12:00:00,000 INFO werkzeug: 127.0.0.1 - - \"GET /quiz/python/get_question?i=3 HTTP/1.1\" 200 -\n"
+LOG_ERROR = (
+    "2026-01-01 12:00:01,000 ERROR app: Exception on /trigger_error [GET]\n"
+    "Traceback (most recent call last):\n"
+    '  File "/app/app.py", line 812, in trigger_error\n'
+    '    raise ValueError("This is a test error for auto-maintain")\n'
+    "ValueError: This is a test error for auto-maintain\n"
+)
+
+
+def timed(fn, repeat, min_time):
+    """Per-call seconds for `repeat` rounds of `number` calls each."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        if time.perf_counter() - started >= min_time:
+            break
+        number *= 2
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - started) / number)
+    return number, rounds
+
+
+# ---------------------------
+# Benchmarks: name -> zero-argument callable, built by setup()
+# ---------------------------
+def setup(workdir, log_size_mb):
+    rng = random.Random(1)
+    repo = QuestionRepository(QUESTIONS_DIR)
+    python_bank = os.path.join(QUESTIONS_DIR, "python.json")
+    compiled_json = os.path.join(workdir, "python.json")
+    shutil.copyfile(python_bank, compiled_json)
+    compiled = CompiledBank("python", build_bank(compiled_json)[0])
+
+    # Model-sized explanation (about 800 tokens) and its streamed pieces
+    explanation = EXPLANATION * 6
+    pieces = split_text(explanation, 200)
+
+    # A large error.log: access lines with a traceback every 200 lines
+    log_path = os.path.join(workdir, "error.log")
+    block = LOG_LINE * 199 + LOG_ERROR
+    with open(log_path, "w") as f:
+        for _ in range(max(1, int(log_size_mb * 1024 * 1024 // len(block)))):
+            f.write(block)
+
+    follower = LogFollower(log_path, state_path=os.path.join(workdir, "offset.json"))
+    follower.read_new()
+
+    def follow():
+        with open(log_path, "a") as f:
+            f.write(LOG_LINE * 20)
+        follower.read_new()
+
+    return {
+        # Sampling a quiz and serialising its questions, once the banks are in memory
+        "load_questions": lambda: [q.to_dict() for q in repo.sample("python", 10, rng)],
+        "load_questions_compiled": lambda: [q.to_dict() for q in compiled.sample(10, rng)],
+        "question_bank_parse": lambda: QuestionBank("python", python_bank),
+        "question_bank_open_compiled": lambda: CompiledBank("python", compiled.path),
+        "clean_explanation": lambda: clean_explanation(explanation),
+        "clean_stream": lambda: "".join(clean_stream(pieces)),
+        "bundled_explanation": lambda: bundled_explanation("a", "b", explanation),
+        "log_tail_lines_50": lambda: tail_lines(log_path, 50),
+        "log_tail_text_5k": lambda: tail_text(log_path, 5000),
+        "log_follower_20_lines": follow,
+        "log_window": lambda: log_window(log_path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the quiz app's hot helper functions.")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per round")
+    parser.add_argument("--log-size-mb", type=float, default=20.0, help="size of the generated error.log")
+    parser.add_argument("--output", help="report path (default benchmarks/results/micro-<commit>-<time>.json)")
+    args = parser.parse_args()
+
+    report = new_report("micro", {
+        "repeat": args.repeat, "min_time": args.min_time, "log_size_mb": args.log_size_mb, "filter": args.filter,
+    })
+    with tempfile.TemporaryDirectory(prefix="quiz-bench-") as workdir:
+        benchmarks = setup(workdir, args.log_size_mb)
+        print(f"{'benchmark':<28} {'calls':>8} {'min us':>10} {'median us':>10} {'mean us':>10}")
+        for name, fn in benchmarks.items():
+            if args.filter not in name:
+                continue
+            number, rounds = timed(fn, args.repeat, args.min_time)
+            median = statistics.median(rounds)
+            result = {
+                "number": number,
+                "repeat": args.repeat,
+                "min_us": round(min(rounds) * 1e6, 3),
+                "median_us": round(median * 1e6, 3),
+                "mean_us": round(statistics.mean(rounds) * 1e6, 3),
+                "ops_per_s": round(1 / median, 1) if median else None,
+            }
+            report["results"][name] = result
+            print(f"{name:<28} {number:>8} {result['min_us']:>10} {result['median_us']:>10} {result['mean_us']:>10}")
+
+    report["rss_kb"]["peak"] = own_peak_rss_kb()
+    print(f"report: {write_report(report, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from app import app, db, User, QuizAttempt
+from app import app, db, User, QuizAttempt, AnswerEvent
 from sqlalchemy import inspect
 
 with app.app_context():
@@ -11,4 +11,6 @@ with app.app_context():
 
     print("\nQuiz Attempts:")
     for a in QuizAttempt.query.all():
-        print(a.id, a.user_id_fk, a.language, a.score, a.total_questions)
\ No newline at end of file
+        print(a.id, a.user_id_fk, a.language, a.score, a.total_questions)
+
+    print("\nAnswer Events:", AnswerEvent.query.count())
\ No newline at end of file
@@ -0,0 +1,219 @@
+"""
+Cached, asynchronous model analysis of error.log for /admin/diagnostics.
+
+The analysis is keyed on a hash of the relevant log window: the distinct
+errors at the end of error.log, with timestamps and repeat occurrences
+dropped. The same errors always map to the same key, so repeated page views
+are served from the cache. When the window changes, a background thread
+computes the new analysis while the page shows the previous one and polls
+for the refreshed result.
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from log_reader import tail_text
+from logging_setup import parse_log_line
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+DIAGNOSTICS_MODEL = "gpt-4o-mini"
+
+
+def log_window(log_path, max_bytes=5000):
+    """
+    (raw tail, relevant text) for the end of the log. The relevant text holds
+    each distinct error once, without timestamps, so it only changes when a
+    different error shows up.
+    """
+    # Whole lines only: a JSON record cut in half would change the key with every new line
+    raw = tail_text(log_path, max_bytes, whole_lines=True) if os.path.exists(log_path) else ""
+    seen = set()
+    parts = []
+    legacy = []
+    for line in raw.splitlines():
+        record = parse_log_line(line)
+        if record is None:
+            # Unparseable JSON isn't an old plain-text line; leave it out of the key
+            if not line.lstrip().startswith("{"):
+                legacy.append(line)
+            continue
+        signature = record.get("traceback_hash") or record.get("message")
+        if signature in seen:
+            continue
+        seen.add(signature)
+        where = f" ({record['route']})" if record.get("route") else ""
+        parts.append(f"{record.get('level', 'ERROR')}{where}: {record.get('message', '')}\n"
+                     f"{record.get('traceback', '')}")
+    if legacy:
+        parts.append("\n".join(legacy))
+    return raw, "\n".join(parts).strip()
+
+
+def window_key(relevant):
+    return hashlib.sha1(f"{DIAGNOSTICS_MODEL}:{relevant}".encode("utf-8")).hexdigest()
+
+
+def build_diagnostics_prompt(relevant):
+    return f"""
+    Analyze these logs and explain:
+    - What caused the errors
+    - Where they happen in code
+    - How to fix them
+
+    Logs:
+    {relevant}
+    """
+
+
+class DiagnosticsService:
+    """
+    Read-through cache in front of the model analysis. `current()` never
+    calls the model; it queues a refresh for the worker thread instead.
+    """
+
+    def __init__(self, client, log_path, db_path, window_bytes=5000, flight=None, retry_after=60):
+        self.client = client
+        self.log_path = log_path
+        self.db_path = db_path
+        self.window_bytes = window_bytes
+        self.flight = flight or SingleFlight()
+        self.retry_after = retry_after
+        self._failed = {}  # key -> time of the last failed analysis
+        self._local = threading.local()
+        self._wanted = None  # (key, relevant) the worker should compute next
+        self._wake = threading.Condition()
+        self._worker_pid = None
+        self.refreshes = 0
+        self.failures = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS diagnostics (
+                key TEXT PRIMARY KEY,
+                analysis TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        conn.commit()
+
+    def _conn(self):
+        # One connection per thread (and per process, since workers fork after import)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ---------------------------
+    # Cache
+    # ---------------------------
+    def _lookup(self, key):
+        return self._conn().execute(
+            "SELECT analysis, created_at FROM diagnostics WHERE key = ?", (key,)
+        ).fetchone()
+
+    def _latest(self):
+        return self._conn().execute(
+            "SELECT analysis, created_at FROM diagnostics ORDER BY created_at DESC LIMIT 1"
+        ).fetchone()
+
+    def _store(self, key, analysis):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO diagnostics (key, analysis, created_at) VALUES (?, ?, ?)",
+            (key, analysis, time.time()),
+        )
+        conn.commit()
+
+    # ---------------------------
+    # Background refresh
+    # ---------------------------
+    def _ensure_worker(self):
+        if self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        threading.Thread(target=self._run, name="diagnostics", daemon=True).start()
+
+    def _request_refresh(self, key, relevant):
+        with self._wake:
+            self._ensure_worker()
+            self._wanted = (key, relevant)
+            self._wake.notify()
+
+    def _analyze(self, relevant):
+        response = self.client.chat.completions.create(
+            model=DIAGNOSTICS_MODEL,
+            messages=[{"role": "user", "content": build_diagnostics_prompt(relevant)}],
+            max_completion_tokens=500,
+        )
+        return response.choices[0].message.content or ""
+
+    def _run(self):
+        while True:
+            with self._wake:
+                while self._wanted is None:
+                    self._wake.wait()
+                key, relevant = self._wanted
+                self._wanted = None
+
+            def compute():
+                analysis = self._analyze(relevant)
+                self._store(key, analysis)
+                self.refreshes += 1
+                return analysis
+
+            try:
+                # Another worker process may be computing (or have computed) the same window
+                self.flight.do(f"diagnostics:{key}", compute,
+                               recheck=lambda: (self._lookup(key) or (None,))[0])
+            except Exception as e:
+                self.failures += 1
+                self._failed[key] = time.monotonic()
+                logger.warning(f"Diagnostics analysis failed: {e}")
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def current(self):
+        """
+        The analysis for the current log window. `status` is "ready" when it
+        matches the window, "pending" while a refresh is running (`analysis`
+        then holds the previous result, if any), "failed" for `retry_after`
+        seconds after a failed refresh, and "empty" with no errors.
+        """
+        raw, relevant = log_window(self.log_path, self.window_bytes)
+        if not relevant:
+            return {"key": None, "status": "empty", "logs": raw or "No logs.",
+                    "analysis": "No errors to analyze.", "generated_at": None}
+
+        key = window_key(relevant)
+        row = self._lookup(key)
+        if row is not None:
+            return {"key": key, "status": "ready", "logs": raw, "analysis": row[0], "generated_at": row[1]}
+
+        # Don't hammer the model with the same window while it keeps failing
+        failed_at = self._failed.get(key)
+        failed = failed_at is not None and time.monotonic() - failed_at < self.retry_after
+        if not failed:
+            self._request_refresh(key, relevant)
+        previous = self._latest()
+        return {
+            "key": key,
+            "status": "failed" if failed else "pending",
+            "logs": raw,
+            "analysis": previous[0] if previous else "Analysis in progress...",
+            "generated_at": previous[1] if previous else None,
+        }
+
+    def stats(self):
+        return {"refreshes": self.refreshes, "failures": self.failures}
@@ -0,0 +1,138 @@
+"""
+Error fingerprinting for the auto-maintain loop.
+
+A traceback is reduced to its exception type plus the (file, function) of each
+frame: no line numbers, messages or addresses. So the same bug always gets
+the same signature, even after unrelated edits move it to another line.
+
+FingerprintIndex records first_seen / last_seen / count per signature and
+tells the caller whether an occurrence is new, a regression (seen again
+after it was marked resolved) or already known.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import time
+
+_FRAME = re.compile(r'^\s*File "([^"]+)", line \d+, in (\S+)', re.MULTILINE)
+_TRACEBACK_START = "Traceback (most recent call last):"
+
+# Frames from the interpreter and installed packages say little about our bug
+_LIBRARY_MARKERS = ("site-packages", "dist-packages", "/lib/python", "\\lib\\python", "<frozen")
+
+
+def _exception_line(tb_text):
+    """The final 'ExcType: message' line of a traceback (frames are indented, it isn't)."""
+    for line in reversed(tb_text.rstrip().splitlines()):
+        if line and not line[0].isspace() and not line.startswith(_TRACEBACK_START):
+            return line.strip()
+    return ""
+
+
+def normalize_traceback(tb_text):
+    """(exception type, [file:function, ...]) with library frames dropped when possible."""
+    frames = [(path, func) for path, func in _FRAME.findall(tb_text)]
+    own = [f for f in frames if not any(marker in f[0] for marker in _LIBRARY_MARKERS)]
+    frames = own or frames
+
+    exc_line = _exception_line(tb_text)
+    exc_type = exc_line.split(":", 1)[0].strip() if exc_line else "Unknown"
+    return exc_type, [f"{os.path.basename(path)}:{func}" for path, func in frames]
+
+
+def fingerprint(tb_text):
+    """Stable signature for a traceback."""
+    exc_type, frames = normalize_traceback(tb_text)
+    raw = exc_type + "|" + "|".join(frames)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def split_tracebacks(text):
+    """Pull the individual tracebacks out of plain-text log output."""
+    blocks = []
+    for part in text.split(_TRACEBACK_START)[1:]:
+        lines = [_TRACEBACK_START]
+        # The first element is the rest of the header line
+        for line in part.splitlines()[1:]:
+            lines.append(line)
+            # The first unindented line is the exception, which ends the traceback
+            if line and not line[0].isspace():
+                break
+        blocks.append("\n".join(lines))
+    return blocks
+
+
+class FingerprintIndex:
+    """SQLite-backed table of error signatures."""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=10)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS error_fingerprints (
+                signature TEXT PRIMARY KEY,
+                exc_type TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                count INTEGER NOT NULL,
+                resolved_at REAL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def observe(self, tb_text, seen_at=None):
+        """
+        Record one occurrence. Returns (signature, status) where status is
+        "new", "regression" (it came back after being resolved) or "known".
+        """
+        seen_at = seen_at or time.time()
+        signature = fingerprint(tb_text)
+        exc_type, _ = normalize_traceback(tb_text)
+        summary = _exception_line(tb_text)[:500]
+
+        row = self.conn.execute(
+            "SELECT resolved_at FROM error_fingerprints WHERE signature = ?", (signature,)
+        ).fetchone()
+
+        if row is None:
+            self.conn.execute(
+                "INSERT INTO error_fingerprints "
+                "(signature, exc_type, summary, first_seen, last_seen, count, resolved_at) "
+                "VALUES (?, ?, ?, ?, ?, 1, NULL)",
+                (signature, exc_type, summary, seen_at, seen_at),
+            )
+            status = "new"
+        else:
+            resolved_at = row[0]
+            status = "regression" if resolved_at is not None and seen_at > resolved_at else "known"
+            self.conn.execute(
+                "UPDATE error_fingerprints SET last_seen = MAX(last_seen, ?), count = count + 1, "
+                "summary = ?, resolved_at = CASE WHEN ? THEN NULL ELSE resolved_at END "
+                "WHERE signature = ?",
+                (seen_at, summary, status == "regression", signature),
+            )
+        self.conn.commit()
+        return signature, status
+
+    def mark_resolved(self, signatures, resolved_at=None):
+        """Mark signatures as fixed; seeing them again later counts as a regression."""
+        resolved_at = resolved_at or time.time()
+        self.conn.executemany(
+            "UPDATE error_fingerprints SET resolved_at = ? WHERE signature = ?",
+            [(resolved_at, s) for s in signatures],
+        )
+        self.conn.commit()
+
+    def top(self, limit=20):
+        """Most recently seen signatures, for dashboards."""
+        rows = self.conn.execute(
+            "SELECT signature, exc_type, summary, first_seen, last_seen, count, resolved_at "
+            "FROM error_fingerprints ORDER BY last_seen DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        keys = ("signature", "exc_type", "summary", "first_seen", "last_seen", "count", "resolved_at")
+        return [dict(zip(keys, row)) for row in rows]
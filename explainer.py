@@ -0,0 +1,93 @@
+EXPLANATION_MODEL = "gpt-4o"
+EXPLANATION_MAX_TOKENS = 800
+
+
+def build_explanation_prompt(question_text, user_answer, correct_answer, all_options):
+    """Build the prompt sent to the model for one answered question."""
+    # Make sure options are a string for the prompt
+    options_str = ", ".join(all_options) if isinstance(all_options, list) else str(all_options)
+
+    return f"""
+Question: {question_text}
+Options: {options_str}
+Correct Answer: {correct_answer}
+User Selected: {user_answer}
+
+Explain in detail:
+1. Why the correct answer is correct:
+2. For each incorrect option, explain why it is wrong:
+3. Why the user's selected answer may be incorrect:
+
+Format in plain text. Do NOT use markdown or asterisks.
+"""
+
+
+def clean_explanation(text):
+    """Strip surrounding whitespace and the leading whitespace of every line."""
+    return "\n".join(line.lstrip() for line in (text or "").strip().splitlines())
+
+
+def request_explanation(client, question_text, user_answer, correct_answer, all_options):
+    """
+    Ask the model for an explanation and return the cleaned text.
+    Errors from the client are left to the caller.
+    """
+    response = client.chat.completions.create(
+        model=EXPLANATION_MODEL,
+        messages=[{
+            "role": "user",
+            "content": build_explanation_prompt(question_text, user_answer, correct_answer, all_options),
+        }],
+        max_completion_tokens=EXPLANATION_MAX_TOKENS
+    )
+    return clean_explanation(getattr(response.choices[0].message, "content", ""))
+
+
+def clean_stream(chunks):
+    """
+    Streaming version of clean_explanation: drops leading blank lines and the
+    leading whitespace of every line as the text arrives.
+    """
+    started = False
+    at_line_start = True
+    for chunk in chunks:
+        out = []
+        for ch in chunk:
+            if ch == "\n":
+                if started:
+                    out.append(ch)
+                at_line_start = True
+            elif at_line_start and ch in " \t\r":
+                continue
+            else:
+                started = True
+                at_line_start = False
+                out.append(ch)
+        if out:
+            yield "".join(out)
+
+
+def stream_explanation(client, question_text, user_answer, correct_answer, all_options):
+    """
+    Ask the model for an explanation with stream=True and yield cleaned text
+    pieces as they arrive. Errors from the client are left to the caller.
+    """
+    stream = client.chat.completions.create(
+        model=EXPLANATION_MODEL,
+        messages=[{
+            "role": "user",
+            "content": build_explanation_prompt(question_text, user_answer, correct_answer, all_options),
+        }],
+        max_completion_tokens=EXPLANATION_MAX_TOKENS,
+        stream=True
+    )
+
+    def deltas():
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            content = getattr(chunk.choices[0].delta, "content", None)
+            if content:
+                yield content
+
+    yield from clean_stream(deltas())
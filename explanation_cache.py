@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Bump this whenever the explanation prompt changes so old answers are ignored
+CACHE_VERSION = 1
+
+
+def question_hash(question_text):
+    """Hash of the question text, used to invalidate entries when a question changes."""
+    return hashlib.sha256((question_text or "").strip().encode("utf-8")).hexdigest()
+
+
+def explanation_key(question_text, all_options, correct_answer, user_answer):
+    """Content-addressed key for one (question, options, correct, selected) tuple."""
+    options = list(all_options) if isinstance(all_options, (list, tuple)) else [str(all_options)]
+    payload = json.dumps(
+        [(question_text or "").strip(), options, correct_answer, user_answer],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExplanationCache:
+    """
+    Two-tier explanation cache:
+    - an in-process LRU dict for the hot set
+    - a SQLite table that survives restarts and is shared by all workers
+
+    Entries older than `ttl` seconds are treated as misses (ttl=None keeps them forever).
+    """
+
+    def __init__(self, db_path, max_memory_items=2048, ttl=None):
+        self.db_path = db_path
+        self.max_memory_items = max_memory_items
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS explanations (
+                key TEXT PRIMARY KEY,
+                question_hash TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                explanation TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_explanations_question ON explanations(question_hash)"
+        )
+        conn.commit()
+
+    # ---------------------------
+    # Connections
+    # ---------------------------
+    def _conn(self):
+        # One connection per thread (and per process, since workers fork after import)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _expired(self, created_at):
+        return self.ttl is not None and time.time() - created_at > self.ttl
+
+    # ---------------------------
+    # Memory tier
+    # ---------------------------
+    def _memory_get(self, key):
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            explanation, created_at = item
+            if self._expired(created_at):
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return explanation
+
+    def _memory_put(self, key, explanation, created_at):
+        with self._lock:
+            self._memory[key] = (explanation, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def get(self, key):
+        """Return the cached explanation for `key`, or None on a miss."""
+        explanation = self._memory_get(key)
+        if explanation is not None:
+            self.hits_memory += 1
+            return explanation
+
+        row = self._conn().execute(
+            "SELECT explanation, created_at FROM explanations WHERE key = ? AND version = ?",
+            (key, CACHE_VERSION),
+        ).fetchone()
+        if row is None or self._expired(row[1]):
+            self.misses += 1
+            return None
+
+        self.hits_disk += 1
+        self._memory_put(key, row[0], row[1])
+        return row[0]
+
+    def contains(self, key):
+        """Check for a live entry without touching the hit/miss counters."""
+        row = self._conn().execute(
+            "SELECT created_at FROM explanations WHERE key = ? AND version = ?",
+            (key, CACHE_VERSION),
+        ).fetchone()
+        return row is not None and not self._expired(row[0])
+
+    def peek_many(self, keys):
+        """
+        {key: explanation} for the live entries among `keys`, in one query and
+        without touching the hit/miss counters (used to build quiz bundles).
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                item = self._memory.get(key)
+                if item is not None and not self._expired(item[1]):
+                    found[key] = item[0]
+                else:
+                    missing.append(key)
+
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            rows = self._conn().execute(
+                f"SELECT key, explanation, created_at FROM explanations "
+                f"WHERE version = ? AND key IN ({','.join('?' * len(chunk))})",
+                (CACHE_VERSION, *chunk),
+            )
+            for key, explanation, created_at in rows:
+                if not self._expired(created_at):
+                    found[key] = explanation
+        return found
+
+    def put(self, key, question_text, explanation):
+        """Store an explanation in both tiers."""
+        created_at = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO explanations (key, question_hash, version, explanation, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (key, question_hash(question_text), CACHE_VERSION, explanation, created_at),
+        )
+        conn.commit()
+        self._memory_put(key, explanation, created_at)
+
+    def invalidate_question(self, question_text):
+        """Drop every cached explanation for one question (e.g. after its text was edited)."""
+        qhash = question_hash(question_text)
+        conn = self._conn()
+        keys = [r[0] for r in conn.execute(
+            "SELECT key FROM explanations WHERE question_hash = ?", (qhash,)
+        )]
+        conn.execute("DELETE FROM explanations WHERE question_hash = ?", (qhash,))
+        conn.commit()
+        with self._lock:
+            for key in keys:
+                self._memory.pop(key, None)
+        return len(keys)
+
+    def prune(self, current_questions):
+        """
+        Remove entries for questions that no longer exist in the banks, entries written
+        by an older CACHE_VERSION, and expired entries. Returns the number of rows removed.
+        """
+        valid = {question_hash(q) for q in current_questions}
+        conn = self._conn()
+        stale = []
+        for key, qhash, version, created_at in conn.execute(
+            "SELECT key, question_hash, version, created_at FROM explanations"
+        ):
+            if qhash not in valid or version != CACHE_VERSION or self._expired(created_at):
+                stale.append(key)
+        conn.executemany("DELETE FROM explanations WHERE key = ?", [(k,) for k in stale])
+        conn.commit()
+        with self._lock:
+            for key in stale:
+                self._memory.pop(key, None)
+        return len(stale)
+
+    def stats(self):
+        hits = self.hits_memory + self.hits_disk
+        total = hits + self.misses
+        return {
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "memory_items": len(self._memory),
+        }
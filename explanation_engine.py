@@ -0,0 +1,332 @@
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from explainer import clean_explanation
+from explanation_cache import explanation_key
+from singleflight import SingleFlight
+
+# Modes:
+#   "ai"       wait up to ai_budget seconds for the model, else answer with the bundled text
+#   "bundled"  answer with the bundled text at once and generate the AI text in the background
+#   "offline"  bundled text only, never call the model
+MODES = ("ai", "bundled", "offline")
+
+logger = logging.getLogger(__name__)
+
+
+def bundled_explanation(selected, correct, bank_explanation):
+    """Build an explanation from the `explanation` field shipped with the question bank."""
+    if not bank_explanation:
+        return ""
+    # Same shape as cleaned model output, so callers don't need to post-process
+    bank_text = "\n".join(line.lstrip() for line in bank_explanation.strip().splitlines())
+    lines = [f"The correct answer is {correct}.", bank_text]
+    if selected != correct:
+        lines.append(f"You selected {selected}, but the correct answer is {correct}.")
+    else:
+        lines.append("Your answer is correct!")
+    return "\n\n".join(lines)
+
+
+class StreamTee:
+    """
+    The pieces of one streamed generation. Any number of readers can follow
+    it from the start, so identical /answer/stream requests share one
+    upstream stream.
+    """
+
+    def __init__(self):
+        self.pieces = []
+        self.finished = False
+        self._cond = threading.Condition()
+
+    def push(self, piece):
+        with self._cond:
+            self.pieces.append(piece)
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    def read(self, index, timeout=None):
+        """Pieces from `index` on, waiting up to `timeout` for one: [] on timeout, None once finished."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.pieces) > index or self.finished, timeout)
+            if len(self.pieces) > index:
+                return self.pieces[index:]
+            return None if self.finished else []
+
+
+class ExplanationEngine:
+    """
+    Tiered explanations:
+    1. the explanation cache (instant)
+    2. the AI model, bounded by `ai_budget` seconds
+    3. the bundled explanation from the question bank (instant, always available)
+
+    A slow model call is never abandoned: it keeps running in the pool and fills
+    the cache, so the next student with the same answer gets the AI text.
+
+    Identical concurrent requests are coalesced: callers share the in-flight
+    future for their key, and `flight` (a SingleFlight, or FileLockSingleFlight
+    to cover other worker processes) makes sure one upstream call is made.
+    With `stream_generate`, stream() does the same for streamed answers: the
+    first caller's generation is teed to everyone asking for that key.
+
+    prefetch() runs on its own pool of `prefetch_workers` threads and never
+    queues work there, so warming explanations can't delay a student's call.
+    """
+
+    def __init__(self, cache, generate, mode="ai", ai_budget=8.0, upgrade=True, workers=8, flight=None,
+                 stream_generate=None, prefetch_workers=2):
+        if mode not in MODES:
+            raise ValueError(f"Unknown explanation mode: {mode}")
+        self.cache = cache
+        self.generate = generate
+        self.stream_generate = stream_generate
+        self.mode = mode
+        self.ai_budget = ai_budget
+        self.upgrade = upgrade
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="explain")
+        self.prefetch_workers = prefetch_workers
+        self._prefetch_pool = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="prefetch")
+        self._prefetching = 0
+        self.flight = flight or SingleFlight()
+        self._pending = {}
+        self._tees = {}  # key -> StreamTee for generations started by stream()
+        self._lock = threading.Lock()
+        self.counts = {"cache": 0, "ai": 0, "bundled": 0, "timeouts": 0, "errors": 0, "coalesced": 0, "prefetched": 0}
+
+    def _generate_and_store(self, key, question_text, selected, correct, options):
+        def compute():
+            explanation = self.generate(question_text, selected, correct, options)
+            if explanation:
+                self.cache.put(key, question_text, explanation)
+            return explanation
+
+        # Another process may have produced it while we waited for the lock
+        explanation, _ = self.flight.do(key, compute, recheck=lambda: self._peek(key))
+        return explanation
+
+    def _peek(self, key):
+        # Not a lookup on the student's behalf, so it mustn't count as a cache miss
+        return self.cache.peek_many([key]).get(key)
+
+    def _stream_and_store(self, key, tee, question_text, selected, correct, options):
+        def compute():
+            parts = []
+            for piece in self.stream_generate(question_text, selected, correct, options):
+                parts.append(piece)
+                tee.push(piece)
+            explanation = clean_explanation("".join(parts))
+            if explanation:
+                self.cache.put(key, question_text, explanation)
+            return explanation
+
+        try:
+            explanation, _ = self.flight.do(key, compute, recheck=lambda: self._peek(key))
+            return explanation
+        finally:
+            tee.close()
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+            self._tees.pop(key, None)
+
+    def _submit(self, key, question_text, selected, correct, options, pool=None):
+        """Start generating `key`, or join the generation already in flight."""
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                self.counts["coalesced"] += 1
+                return future
+            # Run in the caller's context so request-scoped state (e.g. profiling spans) follows it
+            future = (pool or self._pool).submit(
+                contextvars.copy_context().run,
+                self._generate_and_store, key, question_text, selected, correct, options,
+            )
+            self._pending[key] = future
+        future.add_done_callback(lambda _: self._forget(key))
+        return future
+
+    def _submit_stream(self, key, question_text, selected, correct, options):
+        """(future, tee) for a streamed generation of `key`; tee is None when joining a non-streamed one."""
+        with self._lock:
+            future = self._pending.get(key)
+            if future is not None:
+                self.counts["coalesced"] += 1
+                return future, self._tees.get(key)
+            tee = StreamTee()
+            future = self._pool.submit(
+                contextvars.copy_context().run,
+                self._stream_and_store, key, tee, question_text, selected, correct, options,
+            )
+            self._pending[key] = future
+            self._tees[key] = tee
+        future.add_done_callback(lambda _: self._forget(key))
+        return future, tee
+
+    def in_flight(self, key):
+        """The future generating `key` right now, if any."""
+        with self._lock:
+            return self._pending.get(key)
+
+    def explain(self, question_text, selected, correct, options, bank_explanation=""):
+        """Return (explanation, source) where source is "cache", "ai" or "bundled"."""
+        key = explanation_key(question_text, options, correct, selected)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.counts["cache"] += 1
+            return cached, "cache"
+        return self._explain_uncached(key, question_text, selected, correct, options, bank_explanation)
+
+    def _explain_uncached(self, key, question_text, selected, correct, options, bank_explanation):
+        bundled = bundled_explanation(selected, correct, bank_explanation)
+
+        if self.mode == "offline":
+            # Even without bank text: the caller falls back to its own explanation
+            self.counts["bundled"] += 1
+            return bundled, "bundled"
+        if self.mode != "ai" and bundled:
+            if self.mode == "bundled" and self.upgrade:
+                self._submit(key, question_text, selected, correct, options)
+            self.counts["bundled"] += 1
+            return bundled, "bundled"
+
+        started = time.monotonic()
+        future = self._submit(key, question_text, selected, correct, options)
+        try:
+            explanation = future.result(timeout=self.ai_budget)
+        except FutureTimeout:
+            self.counts["timeouts"] += 1
+            logger.warning(f"Explanation exceeded {self.ai_budget}s budget, serving bundled text")
+            explanation = None
+        except Exception as e:
+            self.counts["errors"] += 1
+            logger.warning(f"OpenAI API call failed: {e}")
+            explanation = None
+
+        if explanation:
+            self.counts["ai"] += 1
+            return explanation, "ai"
+
+        self.counts["bundled"] += 1
+        if not bundled:
+            logger.warning(f"No bundled explanation available after {time.monotonic() - started:.1f}s")
+        return bundled, "bundled"
+
+    def stream(self, question_text, selected, correct, options, bank_explanation=""):
+        """
+        Streamed explain(): yields ("delta", text) as the model writes, then
+        ("done", explanation, source). Callers asking for the same key while it
+        is being generated follow the same upstream stream. If no text arrives
+        within `ai_budget` seconds, the bundled text is served instead.
+        """
+        key = explanation_key(question_text, options, correct, selected)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.counts["cache"] += 1
+            yield "delta", cached
+            yield "done", cached, "cache"
+            return
+
+        bundled = bundled_explanation(selected, correct, bank_explanation)
+        if self.stream_generate is None or self.mode == "offline" or (self.mode != "ai" and bundled):
+            # Same tiering as explain(): bundled text now, AI text later via the cache
+            explanation, source = self._explain_uncached(key, question_text, selected, correct, options, bank_explanation)
+            yield "delta", explanation
+            yield "done", explanation, source
+            return
+
+        future, tee = self._submit_stream(key, question_text, selected, correct, options)
+        if tee is None:
+            # A non-streamed generation of this key is already running; wait for it like explain() would
+            explanation, source = self._explain_uncached(key, question_text, selected, correct, options, bank_explanation)
+            yield "delta", explanation
+            yield "done", explanation, source
+            return
+
+        # The budget covers the wait for the first piece; once text is flowing the student sees progress
+        deadline = time.monotonic() + self.ai_budget
+        index = 0
+        while True:
+            timeout = None if index else max(deadline - time.monotonic(), 0)
+            pieces = tee.read(index, timeout)
+            if pieces is None:
+                break
+            if not pieces:
+                # Keeps generating in the pool and fills the cache for the next student
+                self.counts["timeouts"] += 1
+                self.counts["bundled"] += 1
+                logger.warning(f"Explanation stream exceeded {self.ai_budget}s budget, serving bundled text")
+                yield "delta", bundled
+                yield "done", bundled, "bundled"
+                return
+            index += len(pieces)
+            for piece in pieces:
+                yield "delta", piece
+
+        try:
+            explanation = future.result()
+        except Exception as e:
+            self.counts["errors"] += 1
+            logger.warning(f"OpenAI streaming call failed: {e}")
+            explanation = None
+
+        if explanation:
+            if not index:
+                # Another worker process generated it; we only got the finished text
+                yield "delta", explanation
+            self.counts["ai"] += 1
+            yield "done", explanation, "ai"
+            return
+
+        self.counts["bundled"] += 1
+        yield "done", bundled, "bundled"
+
+    def prefetch(self, question_text, correct, options):
+        """
+        Start generating the explanation for every option of a question that
+        isn't cached yet, without waiting. Returns how many were started.
+        """
+        if self.mode == "offline":
+            return 0
+        keys = {opt: explanation_key(question_text, options, correct, opt) for opt in options}
+        cached = self.cache.peek_many(list(keys.values()))
+        started = 0
+        for opt, key in keys.items():
+            if key in cached or self.in_flight(key) is not None:
+                continue
+            # Only start what a prefetch thread can pick up now; a student who
+            # answers this option must not end up queued behind other prefetches
+            with self._lock:
+                if self._prefetching >= self.prefetch_workers:
+                    break
+                self._prefetching += 1
+            future = self._submit(key, question_text, opt, correct, options, pool=self._prefetch_pool)
+            future.add_done_callback(lambda _: self._prefetch_done())
+            started += 1
+        self.counts["prefetched"] += started
+        return started
+
+    def _prefetch_done(self):
+        with self._lock:
+            self._prefetching -= 1
+
+    def stats(self):
+        return dict(
+            self.counts,
+            mode=self.mode,
+            ai_budget=self.ai_budget,
+            pending=len(self._pending),
+            prefetching=self._prefetching,
+            singleflight=self.flight.stats(),
+        )
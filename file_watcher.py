@@ -0,0 +1,184 @@
+"""
+Wait for files to change instead of polling them on a timer.
+
+FileWatcher uses inotify on Linux (through ctypes, no extra dependency) and
+falls back to cheap stat() polling elsewhere. It watches the parent
+directories, so rotation (rename + create) and editors that replace files
+are seen too. Bursts of writes are debounced into a single wake-up.
+
+    watcher = FileWatcher(["error.log", "app.py"])
+    changed = watcher.wait(timeout=60)   # set of paths, empty on timeout
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _InotifyBackend:
+    name = "inotify"
+
+    def __init__(self, paths):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # wd -> directory, and directory -> {basename: full path}
+        self.dirs = {}
+        self.names = {}
+        for path in paths:
+            directory = os.path.dirname(path) or "."
+            self.names.setdefault(directory, {})[os.path.basename(path)] = path
+
+        for directory in self.names:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+            self.dirs[wd] = directory
+
+    def poll(self, timeout):
+        """Changed paths seen within `timeout` seconds (None blocks until something happens)."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + _EVENT_HEADER.size <= len(data):
+                wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "replace")
+                offset += length
+                path = self.names.get(self.dirs.get(wd), {}).get(name)
+                if path:
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _PollingBackend:
+    name = "poll"
+
+    def __init__(self, paths, interval=1.0):
+        self.paths = list(paths)
+        self.interval = interval
+        self.last = {path: self._signature(path) for path in self.paths}
+
+    @staticmethod
+    def _signature(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def poll(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = set()
+            for path in self.paths:
+                signature = self._signature(path)
+                if signature != self.last[path]:
+                    self.last[path] = signature
+                    changed.add(path)
+            if changed:
+                return changed
+
+            if deadline is None:
+                time.sleep(self.interval)
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+                time.sleep(min(self.interval, remaining))
+
+    def close(self):
+        pass
+
+
+class FileWatcher:
+    def __init__(self, paths, debounce=0.25, max_delay=2.0, poll_interval=1.0, force_polling=False):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        backend = None
+        if not force_polling:
+            try:
+                backend = _InotifyBackend(self.paths)
+            except (OSError, AttributeError) as e:
+                logger.info(f"inotify unavailable ({e}), falling back to polling")
+        self.backend = backend or _PollingBackend(self.paths, poll_interval)
+
+    @property
+    def mode(self):
+        return self.backend.name
+
+    def wait(self, timeout=None):
+        """
+        Block until one of the files changes (or `timeout` seconds pass) and
+        return the set of changed paths. After the first change, keep
+        collecting until the files have been quiet for `debounce` seconds
+        (but no longer than `max_delay`), so a burst of writes wakes us once.
+        """
+        changed = self._poll_until(None if timeout is None else time.monotonic() + timeout)
+        if not changed:
+            return set()
+
+        burst_end = time.monotonic() + self.max_delay
+        while True:
+            quiet_for = min(self.debounce, burst_end - time.monotonic())
+            if quiet_for <= 0:
+                break
+            more = self._poll_until(time.monotonic() + quiet_for)
+            if not more:
+                break
+            changed |= more
+        return changed
+
+    def _poll_until(self, deadline):
+        """Changed paths before `deadline` (None: no deadline). Wake-ups for files
+        we don't watch (neighbours in the same directory) keep us waiting."""
+        while True:
+            if deadline is None:
+                remaining = None
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return set()
+            changed = self.backend.poll(remaining)
+            if changed:
+                return changed
+
+    def close(self):
+        self.backend.close()
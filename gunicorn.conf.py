@@ -0,0 +1,116 @@
+"""
+Production serving profile.
+
+Run with:
+    gunicorn -c gunicorn.conf.py app:app
+
+Environment overrides:
+    PORT                  port to listen on (default 5001)
+    QUIZ_WORKER_CLASS     sync | gthread | gevent (default gthread)
+    QUIZ_WORKERS          worker processes (default WEB_CONCURRENCY, else 2 x CPUs + 1,
+                          counting the CPUs this container may use, not the host's)
+    QUIZ_THREADS          threads per gthread worker (default 8)
+    QUIZ_WORKER_CONNECTIONS  concurrent requests per gevent worker (default 200)
+    QUIZ_TIMEOUT          seconds before a silent worker is restarted (default 120)
+    QUIZ_GRACEFUL_TIMEOUT seconds workers get to finish requests on shutdown (default 30)
+    QUIZ_KEEPALIVE        seconds to hold idle keep-alive connections (default 5)
+"""
+import math
+import os
+
+WORKER_CLASSES = ("sync", "gthread", "gevent")
+
+_kind = os.environ.get("QUIZ_WORKER_CLASS", "gthread")
+if _kind not in WORKER_CLASSES:
+    raise RuntimeError(f"QUIZ_WORKER_CLASS must be one of {', '.join(WORKER_CLASSES)}, got {_kind!r}")
+
+
+def _cgroup_cpu_limit():
+    """CPUs allowed by the cgroup quota (v2 cpu.max, or v1 cfs quota/period); None when unlimited."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                quota = f.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = f.read().strip()
+        except OSError:
+            return None
+    if quota in ("max", "-1"):
+        return None
+    return max(1, math.ceil(int(quota) / int(period)))
+
+
+def available_cpus():
+    """CPUs this process may run on: its affinity mask, capped by the container's CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        # No sched_getaffinity on macOS
+        cpus = os.cpu_count() or 1
+    limit = _cgroup_cpu_limit()
+    return min(cpus, limit) if limit else cpus
+
+
+if _kind == "gevent":
+    try:
+        # Patch before the app is preloaded so the OpenAI/HTTP clients become cooperative
+        from gevent import monkey
+        monkey.patch_all()
+    except ImportError:
+        print("gevent is not installed, falling back to the gthread worker")
+        _kind = "gthread"
+
+# ---------------------------
+# Server Socket
+# ---------------------------
+bind = f"0.0.0.0:{os.environ.get('PORT', '5001')}"
+backlog = 2048
+
+# ---------------------------
+# Workers
+# ---------------------------
+worker_class = _kind
+workers = int(os.environ.get("QUIZ_WORKERS") or os.environ.get("WEB_CONCURRENCY") or available_cpus() * 2 + 1)
+# Explanations can stream for a long time, so each worker serves many requests at once
+threads = int(os.environ.get("QUIZ_THREADS", 8)) if _kind == "gthread" else 1
+worker_connections = int(os.environ.get("QUIZ_WORKER_CONNECTIONS", 200))
+
+timeout = int(os.environ.get("QUIZ_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("QUIZ_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("QUIZ_KEEPALIVE", 5))
+
+# Recycle workers now and then so slow leaks can't build up
+max_requests = 2000
+max_requests_jitter = 200
+
+# Import app.py once in the master: db.create_all(), question banks and
+# cache pruning run before fork and the parsed banks are shared copy-on-write
+preload_app = True
+
+# ---------------------------
+# Logging
+# ---------------------------
+accesslog = "-"
+errorlog = "-"
+loglevel = os.environ.get("QUIZ_LOG_LEVEL", "info")
+
+
+# ---------------------------
+# Hooks
+# ---------------------------
+def post_fork(server, worker):
+    # Connections opened by the master before fork must not be shared with workers
+    from app import app, db, metrics
+    with app.app_context():
+        db.engine.dispose()
+    # Heartbeat from the first moment, so an idle worker still shows as alive
+    metrics.start()
+
+
+def worker_exit(server, worker):
+    # Write any buffered quiz answers before the worker goes away
+    from app import attempt_recorder
+    attempt_recorder.close()
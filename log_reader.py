@@ -0,0 +1,168 @@
+"""
+Cheap reads of error.log (or any append-only log).
+
+- tail_lines / tail_text seek backwards from the end of the file, so their cost
+  depends on how much is asked for, not on how big the log has grown.
+- LogFollower returns only the lines appended since the last call and keeps
+  its byte offset in a small JSON file, so it picks up where it left off after
+  a restart. It keeps the file open between calls, so after a rotation (new
+  inode at the path) it first reads the old file to its end and then starts
+  from the beginning of the new one. Truncation (file shorter than the
+  offset, or different first bytes) also restarts it from the beginning.
+"""
+import json
+import os
+
+BLOCK_SIZE = 8192
+HEAD_BYTES = 64
+
+
+def tail_lines(path, num_lines=50, block_size=BLOCK_SIZE):
+    """Last `num_lines` lines of the file (with their newlines), like readlines()[-n:]."""
+    if num_lines <= 0:
+        return []
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return []
+
+    with f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        # One extra newline is needed to be sure the first line is complete
+        while position > 0 and data.count(b"\n") <= num_lines:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    return lines[-num_lines:]
+
+
+def tail_text(path, max_bytes=5000, whole_lines=False):
+    """
+    Last `max_bytes` bytes of the file as text, like read()[-max_bytes:].
+    With `whole_lines`, a line the cut starts in the middle of is left out.
+    """
+    try:
+        f = open(path, "rb")
+    except OSError:
+        return ""
+    with f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        start = max(0, size - max_bytes)
+        if whole_lines and start > 0:
+            # Read one byte early to see whether the cut falls right after a newline
+            f.seek(start - 1)
+            data = f.read()
+            data = data[data.find(b"\n") + 1:] if b"\n" in data else b""
+        else:
+            f.seek(start)
+            data = f.read()
+        return data.decode("utf-8", errors="replace")
+
+
+class LogFollower:
+    """
+    Incremental reader: read_new() returns the complete lines written since the
+    previous call. A line still being written (no trailing newline) is left for
+    the next call.
+
+    On first use (no saved offset) it starts `max_initial_bytes` before the end
+    of the file, so a huge old log isn't replayed in full.
+    """
+
+    def __init__(self, path, state_path=None, max_initial_bytes=64 * 1024):
+        self.path = path
+        self.state_path = state_path
+        self.max_initial_bytes = max_initial_bytes
+        self.inode = None
+        self.offset = None
+        self.head = None
+        self._saved = None  # last state written, so unchanged state isn't rewritten
+        self._file = None
+        self._load_state()
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self.inode = state.get("inode")
+            self.offset = state.get("offset")
+            self.head = state.get("head")
+            self._saved = (self.inode, self.offset, self.head)
+        except (OSError, ValueError):
+            self.inode = self.offset = self.head = None
+
+    def _save_state(self):
+        state = (self.inode, self.offset, self.head)
+        if not self.state_path or state == self._saved:
+            return
+        os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"inode": self.inode, "offset": self.offset, "head": self.head}, f)
+        os.replace(tmp, self.state_path)
+        self._saved = state
+
+    def read_new(self):
+        lines = []
+        if self._file is not None:
+            try:
+                current = os.stat(self.path).st_ino
+            except OSError:
+                current = None
+            if current != self.inode:
+                # Rotated: our descriptor still points at the old file, so finish it
+                # (a logger may have written to it since the last call) before moving on
+                lines = self._read(final=True)
+                self.close()
+                self.offset = 0
+                self.inode = self.head = None
+
+        if self._file is None:
+            try:
+                self._file = open(self.path, "rb")
+            except OSError:
+                self._save_state()
+                return lines
+
+        f = self._file
+        st = os.fstat(f.fileno())
+        f.seek(0)
+        head = f.read(HEAD_BYTES).hex()
+        if self.offset is None:
+            self.offset = max(0, st.st_size - self.max_initial_bytes)
+            if self.offset > 0:
+                # Don't start in the middle of a line
+                f.seek(self.offset - 1)
+                f.readline()
+                self.offset = f.tell()
+        elif (st.st_ino != self.inode or st.st_size < self.offset
+              or not head.startswith(self.head or "")):
+            # A different file than the saved state (rotated while we weren't running), or truncated
+            self.offset = 0
+        self.inode = st.st_ino
+        self.head = head
+
+        lines += self._read()
+        self._save_state()
+        return lines
+
+    def _read(self, final=False):
+        """Complete lines from the offset on; with `final`, an unterminated last line too."""
+        self._file.seek(self.offset)
+        data = self._file.read()
+        end = len(data) if final else data.rfind(b"\n") + 1
+        self.offset += end
+        return data[:end].decode("utf-8", errors="replace").splitlines(keepends=True)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
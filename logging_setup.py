@@ -0,0 +1,195 @@
+"""
+Non-blocking, structured logging.
+
+Request threads only put records on an in-memory queue (QueueHandler). A
+QueueListener thread formats them as JSON lines and writes them to
+size-rotated files:
+
+    error.log  ERROR and above (what auto_maintain and the dashboards read)
+    app.log    INFO and above (access lines with route + latency, clicks, ...)
+
+Every line is one JSON object with stable fields: ts, level, logger, message,
+pid, and when present route, method, status, latency_ms, exc_type,
+exc_message, traceback, traceback_hash. Extra fields passed with
+`extra={...}` are included as-is.
+"""
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import traceback
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from error_fingerprints import fingerprint
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation is only safe with a single process
+    fcntl = None
+
+try:
+    from flask import has_request_context, request
+except ImportError:  # used by scripts that don't run inside Flask
+    has_request_context = None
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+
+        if record.exc_info and record.exc_info[0] is not None:
+            exc_type, exc, tb = record.exc_info
+            tb_text = "".join(traceback.format_exception(exc_type, exc, tb))
+            entry["exc_type"] = exc_type.__name__
+            entry["exc_message"] = str(exc)
+            entry["traceback"] = tb_text
+            entry["traceback_hash"] = fingerprint(tb_text)
+
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Tag records logged while handling a request with its route and method."""
+
+    def filter(self, record):
+        if has_request_context is not None and has_request_context():
+            if not hasattr(record, "route"):
+                record.route = request.url_rule.rule if request.url_rule else request.path
+            if not hasattr(record, "method"):
+                record.method = request.method
+        return True
+
+
+class SafeRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that several worker processes can share: writes and
+    rollovers happen under an fcntl lock, and a process reopens the file when
+    another process has already rotated it.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._lock_path = f"{self.baseFilename}.lock"
+
+    def _reopen_if_rotated(self):
+        try:
+            on_disk = os.stat(self.baseFilename).st_ino
+        except FileNotFoundError:
+            on_disk = None
+        if self.stream is None or on_disk != os.fstat(self.stream.fileno()).st_ino:
+            if self.stream is not None:
+                self.stream.close()
+            self.stream = self._open()
+
+    def emit(self, record):
+        if fcntl is None:
+            return super().emit(record)
+        try:
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._reopen_if_rotated()
+                    if self.shouldRollover(record):
+                        self.doRollover()
+                    logging.FileHandler.emit(self, record)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+
+class ForkSafeQueueHandler(QueueHandler):
+    """
+    QueueHandler whose listener thread is (re)started in whichever process
+    logs. gunicorn forks workers after app.py is imported, and threads don't
+    survive fork, so each worker needs its own listener.
+    """
+
+    def __init__(self, handlers):
+        super().__init__(queue.SimpleQueue())
+        self.handlers = handlers
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.SimpleQueue()
+            self._listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        super().enqueue(record)
+
+    def prepare(self, record):
+        # Format the traceback in the listener, not in the request thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def stop(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+
+
+def configure_logging(log_dir=".", error_log="error.log", app_log="app.log",
+                      max_bytes=10 * 1024 * 1024, backup_count=5):
+    """Install the queue-based JSON logging pipeline on the root logger."""
+    formatter = JsonFormatter()
+
+    error_handler = SafeRotatingFileHandler(
+        os.path.join(log_dir, error_log), maxBytes=max_bytes, backupCount=backup_count
+    )
+    error_handler.setLevel(logging.ERROR)
+    error_handler.setFormatter(formatter)
+
+    app_handler = SafeRotatingFileHandler(
+        os.path.join(log_dir, app_log), maxBytes=max_bytes, backupCount=backup_count
+    )
+    app_handler.setLevel(logging.INFO)
+    app_handler.setFormatter(formatter)
+
+    queue_handler = ForkSafeQueueHandler([error_handler, app_handler])
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(logging.INFO)
+
+    # Our own access records carry route and latency; werkzeug's would be duplicates
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    return queue_handler
+
+
+def parse_log_line(line):
+    """JSON record for a log line, or None for old plain-text lines."""
+    line = line.strip()
+    if not line.startswith("{"):
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
@@ -0,0 +1,264 @@
+"""
+In-process metrics, exposed in the Prometheus text format at /metrics.
+
+Each process keeps its own counters (requests and latency per route, plus
+whatever the registered collectors report: model gateway, caches, ...). A
+heartbeat thread writes them to <snapshot_dir>/<pid>.json every `interval`
+seconds. /metrics sums the snapshots of all live workers, whichever one
+serves the scrape. A worker whose heartbeat is older than `stale_after` is
+reported as down and left out of the sums.
+
+    metrics = Metrics("instance/metrics")
+    metrics.describe("quiz_cache_hits_total", "counter", "Explanation cache hits")
+    metrics.add_collector(lambda: [("quiz_cache_hits_total", {}, cache.hits)])
+    metrics.observe_request("/quiz/<language>", "GET", 200, 0.012)
+    text = metrics.render()
+"""
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_SUFFIXES = ("_bucket", "_sum", "_count")
+
+
+def _labels_key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _format_value(value):
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _le_order(labels):
+    le = dict(labels).get("le")
+    if le is None:
+        return 0.0
+    return float("inf") if le == "+Inf" else float(le)
+
+
+class Metrics:
+    def __init__(self, snapshot_dir, interval=5.0, stale_after=None):
+        self.snapshot_dir = snapshot_dir
+        self.interval = interval
+        self.stale_after = stale_after or interval * 3
+        self.started = time.time()
+        self._pid = os.getpid()
+        self.families = {}
+        self._samples = defaultdict(float)
+        self._collectors = []
+        self._derived = []
+        self._lock = threading.Lock()
+        self._heartbeat_pid = None
+        os.makedirs(snapshot_dir, exist_ok=True)
+
+        self.describe("quiz_http_requests_total", "counter", "HTTP requests by route, method and status")
+        self.describe("quiz_http_request_duration_seconds", "histogram", "Time to response headers by route")
+        self.describe("quiz_workers_alive", "gauge", "Worker processes with a recent heartbeat")
+        self.describe("quiz_worker_heartbeat_age_seconds", "gauge", "Seconds since each worker's last heartbeat")
+        self.describe("quiz_worker_uptime_seconds", "gauge", "Seconds since each worker started")
+
+    # ---------------------------
+    # Registration
+    # ---------------------------
+    def describe(self, name, kind, help_text):
+        self.families[name] = (kind, help_text)
+
+    def add_collector(self, fn):
+        """fn() returns [(name, {label: value}, number), ...]; values are summed across workers."""
+        self._collectors.append(fn)
+
+    def add_derived(self, name, fn):
+        """A gauge computed from the summed samples, e.g. a ratio: fn(total) -> number,
+        where total(metric_name) sums that metric over all label sets and workers."""
+        self._derived.append((name, fn))
+
+    # ---------------------------
+    # Recording
+    # ---------------------------
+    def observe_request(self, route, method, status, seconds):
+        request_key = ("quiz_http_requests_total",
+                       _labels_key({"route": route, "method": method, "status": status}))
+        route_key = _labels_key({"route": route})
+        with self._lock:
+            self._samples[request_key] += 1
+            for bound in REQUEST_BUCKETS:
+                if seconds <= bound:
+                    self._samples[("quiz_http_request_duration_seconds_bucket",
+                                   route_key + (("le", str(bound)),))] += 1
+            self._samples[("quiz_http_request_duration_seconds_bucket", route_key + (("le", "+Inf"),))] += 1
+            self._samples[("quiz_http_request_duration_seconds_sum", route_key)] += seconds
+            self._samples[("quiz_http_request_duration_seconds_count", route_key)] += 1
+        self.start()
+
+    def local_samples(self):
+        with self._lock:
+            samples = dict(self._samples)
+        for collector in self._collectors:
+            try:
+                for name, labels, value in collector():
+                    key = (name, _labels_key(labels))
+                    samples[key] = samples.get(key, 0) + value
+            except Exception as e:
+                logger.warning(f"Metrics collector failed: {e}")
+        return samples
+
+    # ---------------------------
+    # Heartbeat snapshots
+    # ---------------------------
+    def _snapshot_path(self, pid):
+        return os.path.join(self.snapshot_dir, f"{pid}.json")
+
+    def write_snapshot(self):
+        snapshot = {
+            "pid": os.getpid(),
+            "started": self.started,
+            "heartbeat": time.time(),
+            "samples": [[name, list(labels), value] for (name, labels), value in self.local_samples().items()],
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir, prefix=".snapshot-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self._snapshot_path(os.getpid()))
+
+    def _heartbeat(self):
+        while True:
+            try:
+                self.write_snapshot()
+            except OSError as e:
+                logger.warning(f"Metrics snapshot failed: {e}")
+            time.sleep(self.interval)
+
+    def start(self):
+        """Start this process's heartbeat thread (again after a fork)."""
+        if self._heartbeat_pid == os.getpid():
+            return
+        with self._lock:
+            if self._heartbeat_pid == os.getpid():
+                return
+            self._heartbeat_pid = os.getpid()
+            if self._pid != os.getpid():
+                # A forked worker counts from zero, not from the master's numbers
+                self._samples.clear()
+                self.started = time.time()
+                self._pid = os.getpid()
+        threading.Thread(target=self._heartbeat, name="metrics-heartbeat", daemon=True).start()
+
+    # ---------------------------
+    # Exposition
+    # ---------------------------
+    def collect(self):
+        """(summed samples over live workers, {pid: (heartbeat age, uptime)})."""
+        now = time.time()
+        totals = defaultdict(float)
+        workers = {}
+
+        own = os.getpid()
+        for key, value in self.local_samples().items():
+            totals[key] += value
+        workers[own] = (0.0, now - self.started)
+
+        for filename in os.listdir(self.snapshot_dir):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(self.snapshot_dir, filename)
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            pid = snapshot.get("pid")
+            if pid == own:
+                continue
+            age = now - snapshot.get("heartbeat", 0)
+            if age > self.stale_after:
+                # Long-gone workers (recycled by max_requests, restarted, ...) are cleaned up
+                if age > self.stale_after * 20:
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+                continue
+            workers[pid] = (age, now - snapshot.get("started", now))
+            for name, labels, value in snapshot.get("samples", []):
+                totals[(name, tuple(tuple(pair) for pair in labels))] += value
+
+        return totals, workers
+
+    def render(self):
+        totals, workers = self.collect()
+        totals[("quiz_workers_alive", ())] = len(workers)
+        for pid, (age, uptime) in workers.items():
+            totals[("quiz_worker_heartbeat_age_seconds", (("pid", str(pid)),))] = round(age, 3)
+            totals[("quiz_worker_uptime_seconds", (("pid", str(pid)),))] = round(uptime, 3)
+
+        def total(metric_name):
+            return sum(value for (name, _), value in totals.items() if name == metric_name)
+
+        for name, fn in self._derived:
+            try:
+                totals[(name, ())] = fn(total)
+            except ZeroDivisionError:
+                totals[(name, ())] = 0
+
+        by_family = defaultdict(list)
+        for (name, labels), value in totals.items():
+            family = name
+            for suffix in _SUFFIXES:
+                if name.endswith(suffix) and name[:-len(suffix)] in self.families:
+                    family = name[:-len(suffix)]
+            by_family[family].append((name, labels, value))
+
+        lines = []
+        for family in sorted(by_family):
+            kind, help_text = self.families.get(family, ("untyped", ""))
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            samples = sorted(by_family[family], key=lambda s: (
+                [v for k, v in s[1] if k != "le"], s[0], _le_order(s[1])))
+            for name, labels, value in samples:
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+_SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse_prometheus(text):
+    """[(name, {label: value}, float), ...] from Prometheus text output."""
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        match = _SAMPLE_LINE.match(line.strip())
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        labels = {k: v.replace('\\"', '"').replace("\\\\", "\\") for k, v in _LABEL.findall(labels or "")}
+        try:
+            samples.append((name, labels, float(value)))
+        except ValueError:
+            continue
+    return samples
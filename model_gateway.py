@@ -0,0 +1,237 @@
+"""
+Shared gateway in front of the OpenAI client.
+
+Every model call in the app goes through ModelGateway, which adds:
+- a per-call deadline
+- a cap on concurrent upstream requests (callers over the cap wait up to
+  `acquire_timeout` seconds for a slot, then fail with GatewayBusyError)
+- jittered retries for transient errors (timeouts, 429, 5xx)
+- a circuit breaker that fails fast while the upstream is unhealthy
+- metrics: in-flight count, breaker trips, latency histogram
+
+The gateway exposes the same `gateway.chat.completions.create(...)` shape as
+the OpenAI client, so it can be passed anywhere a client is expected. To test
+against a local fake server, point the wrapped client at it with
+OPENAI_BASE_URL (or OpenAI(base_url=...)).
+"""
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class GatewayError(Exception):
+    """Base class for calls the gateway refused to make."""
+
+
+class CircuitOpenError(GatewayError):
+    pass
+
+
+class GatewayBusyError(GatewayError):
+    pass
+
+
+def is_retryable(error):
+    """Timeouts, connection errors, rate limits and 5xx responses are worth retrying."""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(error).__name__
+    return name in ("APITimeoutError", "APIConnectionError", "TimeoutError", "ConnectionError")
+
+
+def is_outage(error):
+    """Anything but a 4xx answer (other than 429) means the upstream is unhealthy."""
+    status = getattr(error, "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls go through; `failure_threshold` failures in a row trip it open
+    open      -> calls fail fast until `reset_timeout` seconds have passed
+    half_open -> one probe call is let through; success closes, failure re-opens
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.trips += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class ModelGateway:
+    def __init__(self, client, max_in_flight=8, acquire_timeout=2.0, timeout=30.0,
+                 retries=2, backoff_base=0.5, failure_threshold=5, reset_timeout=30.0):
+        self.client = client
+        self.max_in_flight = max_in_flight
+        self.acquire_timeout = acquire_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.rejected = 0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+
+        # OpenAI-shaped facade: gateway.chat.completions.create(...)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    # ---------------------------
+    # Bookkeeping
+    # ---------------------------
+    def _observe(self, seconds, ok):
+        with self._lock:
+            self.calls += 1
+            if not ok:
+                self.errors += 1
+            self.latency_sum += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self.latency_buckets[i] += 1
+                    break
+            else:
+                self.latency_buckets[-1] += 1
+
+    def _acquire(self):
+        # Slot first: asking the breaker claims the half-open probe, which must
+        # only happen for a call that is actually going to be made
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise GatewayBusyError(f"More than {self.max_in_flight} model calls in flight")
+        if not self.breaker.allow():
+            self._slots.release()
+            with self._lock:
+                self.rejected += 1
+            raise CircuitOpenError("Model circuit breaker is open")
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    # ---------------------------
+    # Calls
+    # ---------------------------
+    def create(self, timeout=None, **kwargs):
+        """Drop-in for client.chat.completions.create with deadline, retries and breaker."""
+        if kwargs.get("stream"):
+            return self._stream(timeout, kwargs)
+
+        deadline = time.monotonic() + (timeout or self.timeout)
+        self._acquire()
+        try:
+            attempt = 0
+            while True:
+                remaining = deadline - time.monotonic()
+                started = time.monotonic()
+                try:
+                    response = self.client.chat.completions.create(timeout=max(remaining, 0.1), **kwargs)
+                except Exception as e:
+                    self._observe(time.monotonic() - started, ok=False)
+                    delay = min(self.backoff_base * (2 ** attempt), 8.0)
+                    delay = random.uniform(0, delay)
+                    if attempt >= self.retries or not is_retryable(e) or time.monotonic() + delay >= deadline:
+                        if is_outage(e):
+                            self.breaker.record_failure()
+                        else:
+                            self.breaker.record_success()
+                        raise
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+
+                self._observe(time.monotonic() - started, ok=True)
+                self.breaker.record_success()
+                return response
+        finally:
+            self._release()
+
+    def _stream(self, timeout, kwargs):
+        """
+        Streaming calls are not retried once started. This is a generator, so the
+        slot is only taken when iteration starts and is always released at the end.
+        """
+        self._acquire()
+        started = time.monotonic()
+        ok = False
+        try:
+            yield from self.client.chat.completions.create(timeout=timeout or self.timeout, **kwargs)
+            ok = True
+        except GeneratorExit:
+            # The reader went away (e.g. the browser closed the stream); not an upstream failure
+            ok = True
+            raise
+        finally:
+            self._observe(time.monotonic() - started, ok=ok)
+            if ok:
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            self._release()
+
+    # ---------------------------
+    # Metrics
+    # ---------------------------
+    def stats(self):
+        with self._lock:
+            histogram = {}
+            running = 0
+            for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], self.latency_buckets):
+                running += count
+                histogram[str(bound)] = running
+            return {
+                "circuit_state": self.breaker.state,
+                "circuit_trips": self.breaker.trips,
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "calls": self.calls,
+                "errors": self.errors,
+                "rejected": self.rejected,
+                "latency_sum": round(self.latency_sum, 4),
+                "latency_histogram": histogram,
+            }
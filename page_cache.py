@@ -0,0 +1,173 @@
+"""
+Render-once cache for pages whose HTML only changes on deploy.
+
+The home and study pages depend on nothing but the templates, the question
+banks (the home page lists the languages) and the asset manifest (hashed
+URLs). PageCache renders each page once, keeps the body with a strong ETag
+and a gzip'd copy, and answers If-None-Match with a 304 without rendering.
+
+Invalidation is a stat() scan of the watched paths, done at most once every
+`check_interval` seconds: any added, removed or modified file drops every
+cached page, and the next request renders it again.
+
+    page_cache = PageCache([templates_dir, questions_dir, manifest_path])
+
+    @app.route("/study/python")
+    @page_cache.cached
+    def study_py():
+        return render_template("study/python_study.html")
+
+    page_cache.warm(app)   # pre-render every cached page at startup
+"""
+import functools
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from flask import Response, request, session, url_for
+
+logger = logging.getLogger(__name__)
+
+# Browsers keep the copy but revalidate it; the ETag makes that a 304
+CACHE_CONTROL = "no-cache"
+
+
+class CachedPage:
+    __slots__ = ("body", "gzipped", "etag", "mimetype")
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.gzipped = gzipped if len(gzipped) < len(body) else None
+
+
+class PageCache:
+    def __init__(self, watch_paths, check_interval=2.0):
+        self.watch_paths = list(watch_paths)
+        self.check_interval = check_interval
+        self.endpoints = []
+        self.hits = 0
+        self.not_modified = 0
+        self.renders = 0
+        self.invalidations = 0
+        self._pages = {}
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._signature = self._scan()
+
+    # ---------------------------
+    # Invalidation
+    # ---------------------------
+    def _scan(self):
+        """(path, mtime_ns, size) of every file under the watched paths."""
+        entries = []
+        for root in self.watch_paths:
+            if os.path.isfile(root):
+                candidates = [root]
+            else:
+                candidates = [
+                    os.path.join(dirpath, filename)
+                    for dirpath, _, filenames in os.walk(root) for filename in filenames
+                ]
+            for path in candidates:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_mtime_ns, st.st_size))
+        return frozenset(entries)
+
+    def _check(self):
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        with self._lock:
+            if now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+            signature = self._scan()
+            if signature != self._signature:
+                self._signature = signature
+                if self._pages:
+                    self.invalidations += 1
+                    logger.info("Templates or question banks changed, dropping cached pages")
+                self._pages = {}
+
+    # ---------------------------
+    # Serving
+    # ---------------------------
+    def cached(self, view):
+        """Decorator for views that take no arguments and render the same page for everyone."""
+        self.endpoints.append(view.__name__)
+
+        @functools.wraps(view)
+        def wrapper():
+            # The layout greets a signed-in user by name; those pages are per user
+            if session.get("user"):
+                return view()
+
+            self._check()
+            key = (request.script_root, request.path)
+            page = self._pages.get(key)
+            if page is not None:
+                return self._respond(page)
+
+            response = view()
+            if not isinstance(response, str):
+                # Redirects, errors or anything else unusual aren't cached
+                return response
+            return self._respond(self._store(key, response), rendered=True)
+
+        return wrapper
+
+    def _store(self, key, html):
+        page = CachedPage(html.encode("utf-8"), "text/html")
+        self.renders += 1
+        with self._lock:
+            # A page that was rendered mid-invalidation is simply rendered again next time
+            self._pages[key] = page
+        return page
+
+    def _respond(self, page, rendered=False):
+        use_gzip = page.gzipped is not None and "gzip" in request.headers.get("Accept-Encoding", "")
+        # Strong ETags name exact bytes, so each encoding gets its own
+        etag = page.etag + "-gz" if use_gzip else page.etag
+
+        if request.if_none_match.contains(etag):
+            self.not_modified += 1
+            response = Response(status=304)
+        else:
+            if not rendered:
+                self.hits += 1
+            response = Response(page.gzipped if use_gzip else page.body, mimetype=page.mimetype)
+            if use_gzip:
+                response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(etag)
+        response.vary.add("Accept-Encoding")
+        response.headers["Cache-Control"] = CACHE_CONTROL
+        return response
+
+    def warm(self, app):
+        """Render every cached page now instead of on its first request."""
+        for endpoint in self.endpoints:
+            with app.test_request_context():
+                path = url_for(endpoint)
+            with app.test_request_context(path):
+                try:
+                    app.view_functions[endpoint]()
+                except Exception as e:
+                    logger.error(f"Pre-rendering {path} failed: {e}")
+
+    def stats(self):
+        return {
+            "pages": len(self._pages),
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "renders": self.renders,
+            "invalidations": self.invalidations,
+        }
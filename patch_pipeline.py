@@ -0,0 +1,301 @@
+"""
+Validate a patch in a scratch copy of the tree before it touches live files.
+
+    pipeline = PatchPipeline(root)
+    result = pipeline.run(patch_text, target="app.py")
+    if result.ok: ...            # files were swapped in atomically
+    else: result.stage, result.detail
+
+Stages, each one stopping the run on failure:
+
+    parse    the text is a unified diff
+    apply    every hunk applies (at its line number, or where its context is found)
+    compile  the patched .py files byte-compile
+    import   `import app` succeeds in a fresh interpreter
+    smoke    /health, / and /quiz/python answer below 400, one subprocess each, in parallel
+    swap     files are replaced with os.replace (write temp file, fsync, rename)
+
+The live app keeps serving the old code the whole time; nothing on disk
+changes until every check has passed.
+"""
+import logging
+import os
+import py_compile
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+SMOKE_PATHS = ("/health", "/", "/quiz/python")
+COPY_IGNORE = shutil.ignore_patterns(
+    ".git", "instance", "__pycache__", "*.log", "*.log.*", "*.db", "venv", ".venv", "node_modules"
+)
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# Runs inside the scratch copy; exit status says whether the route answered
+_SMOKE_SCRIPT = """
+import sys
+import app
+response = app.app.test_client().get(sys.argv[1])
+print(response.status_code)
+sys.exit(0 if response.status_code < 400 else 1)
+"""
+
+
+class PatchError(Exception):
+    def __init__(self, stage, detail):
+        super().__init__(f"{stage}: {detail}")
+        self.stage = stage
+        self.detail = detail
+
+
+class PatchResult:
+    def __init__(self, ok, stage, detail="", files=()):
+        self.ok = ok
+        self.stage = stage
+        self.detail = detail
+        self.files = list(files)
+
+    def to_dict(self):
+        return {"ok": self.ok, "stage": self.stage, "detail": self.detail, "files": self.files}
+
+
+# ---------------------------
+# Parsing
+# ---------------------------
+class Hunk:
+    __slots__ = ("old_start", "lines")
+
+    def __init__(self, old_start):
+        # 1-based line the hunk claims to start at; None for a bare "@@"
+        self.old_start = old_start
+        self.lines = []  # (" " | "-" | "+", text)
+
+    def old_block(self):
+        return [text for tag, text in self.lines if tag != "+"]
+
+    def new_block(self):
+        return [text for tag, text in self.lines if tag != "-"]
+
+
+def _strip_path(header):
+    path = header.split("\t", 1)[0].strip()
+    if path[:2] in ("a/", "b/"):
+        path = path[2:]
+    return path
+
+
+def parse_unified_diff(patch_text):
+    """[(old_path, new_path, [Hunk, ...]), ...] for each file in the diff."""
+    files = []
+    current = None
+    hunk = None
+
+    lines = patch_text.splitlines(keepends=True)
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            current = (_strip_path(line[4:]), _strip_path(lines[i + 1][4:]), [])
+            files.append(current)
+            hunk = None
+            i += 2
+            continue
+
+        if line.startswith("@@"):
+            if current is None:
+                raise PatchError("parse", "hunk before any ---/+++ file header")
+            match = _HUNK_HEADER.match(line)
+            hunk = Hunk(int(match.group(1)) if match else None)
+            current[2].append(hunk)
+        elif hunk is not None and line[:1] in (" ", "-", "+"):
+            hunk.lines.append((line[0], line[1:]))
+        elif hunk is not None and line.startswith("\\"):
+            # "\ No newline at end of file" applies to the previous line
+            if hunk.lines:
+                tag, text = hunk.lines[-1]
+                hunk.lines[-1] = (tag, text.rstrip("\r\n"))
+        elif hunk is not None and line.strip() == "":
+            # Some generators drop the leading space of empty context lines
+            hunk.lines.append((" ", line))
+        i += 1
+
+    for _, _, hunks in files:
+        for h in hunks:
+            # Blank lines trailing the last hunk are usually just the end of the message
+            while h.lines and h.lines[-1][0] == " " and not h.lines[-1][1].strip():
+                h.lines.pop()
+
+    files = [f for f in files if f[2]]
+    if not files:
+        raise PatchError("parse", "no hunks found")
+    return files
+
+
+# ---------------------------
+# Applying
+# ---------------------------
+def _matches(lines, block, at):
+    if at < 0 or at + len(block) > len(lines):
+        return False
+    return all(lines[at + k].rstrip("\r\n") == block[k].rstrip("\r\n") for k in range(len(block)))
+
+
+def _locate(lines, block, hint):
+    """Index where `block` occurs, preferring the one closest to `hint`."""
+    if hint is not None and _matches(lines, block, hint):
+        return hint
+    candidates = [at for at in range(len(lines) - len(block) + 1) if _matches(lines, block, at)]
+    if not candidates:
+        return None
+    if hint is None:
+        return candidates[0]
+    return min(candidates, key=lambda at: abs(at - hint))
+
+
+def apply_hunks(original_lines, hunks):
+    """Apply hunks to a list of lines (with line endings) and return the new list."""
+    lines = list(original_lines)
+    offset = 0
+    search_from = 0
+    for number, hunk in enumerate(hunks, 1):
+        old = hunk.old_block()
+        hint = None if hunk.old_start is None else max(hunk.old_start - 1 + offset, 0)
+        if not old:
+            # Pure insertion: "-N,0" means after line N, so N is already the 0-based index
+            at = min(hunk.old_start + offset, len(lines)) if hunk.old_start is not None else len(lines)
+        else:
+            at = _locate(lines[search_from:], old, None if hint is None else hint - search_from)
+            if at is None:
+                raise PatchError("apply", f"hunk {number} does not match the file")
+            at += search_from
+
+        new = hunk.new_block()
+        lines[at:at + len(old)] = new
+        search_from = at + len(new)
+        if hunk.old_start is not None:
+            offset += len(new) - len(old)
+    return lines
+
+
+def _safe_path(root, relative):
+    path = os.path.realpath(os.path.join(root, relative))
+    if os.path.commonpath([path, os.path.realpath(root)]) != os.path.realpath(root):
+        raise PatchError("parse", f"{relative} is outside the project")
+    return path
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+class PatchPipeline:
+    def __init__(self, root, smoke_paths=SMOKE_PATHS, app_module="app", timeout=60):
+        self.root = os.path.abspath(root)
+        self.smoke_paths = tuple(smoke_paths)
+        self.app_module = app_module
+        self.timeout = timeout
+
+    def _env(self, scratch):
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1", PYTHONPATH=scratch)
+        # The checks never call the model, but app.py needs a key to import
+        env.setdefault("OPENAI_API_KEY", "patch-validation")
+        env.pop("QUIZ_LISTEN_FD", None)
+        env.pop("QUIZ_READY_FD", None)
+        return env
+
+    def _run(self, args, scratch):
+        try:
+            proc = subprocess.run(
+                [sys.executable, *args], cwd=scratch, env=self._env(scratch),
+                capture_output=True, text=True, timeout=self.timeout,
+            )
+        except subprocess.TimeoutExpired:
+            return False, f"timed out after {self.timeout}s"
+        output = (proc.stdout + proc.stderr).strip()
+        return proc.returncode == 0, output[-2000:]
+
+    def prepare(self, patch_text, target=None):
+        """{relative path: new content} for every file the patch touches."""
+        files = parse_unified_diff(patch_text)
+        if target is not None and len(files) > 1:
+            raise PatchError("parse", f"expected a patch for {target}, got {len(files)} files")
+
+        changes = {}
+        for old_path, new_path, hunks in files:
+            relative = target or (new_path if new_path != "/dev/null" else old_path)
+            path = _safe_path(self.root, relative)
+            original = []
+            if os.path.exists(path):
+                with open(path) as f:
+                    original = f.readlines()
+            changes[os.path.relpath(path, self.root)] = "".join(apply_hunks(original, hunks))
+        return changes
+
+    def validate(self, changes):
+        """Run compile, import and smoke checks against a scratch copy; raise PatchError on failure."""
+        with tempfile.TemporaryDirectory(prefix="patch-check-") as tmp:
+            scratch = os.path.join(tmp, "tree")
+            shutil.copytree(self.root, scratch, ignore=COPY_IGNORE)
+
+            for relative, content in changes.items():
+                path = os.path.join(scratch, relative)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    f.write(content)
+
+            for relative in changes:
+                if relative.endswith(".py"):
+                    try:
+                        py_compile.compile(os.path.join(scratch, relative), doraise=True)
+                    except py_compile.PyCompileError as e:
+                        raise PatchError("compile", e.msg)
+
+            ok, output = self._run(["-c", f"import {self.app_module}"], scratch)
+            if not ok:
+                raise PatchError("import", output)
+
+            with ThreadPoolExecutor(max_workers=len(self.smoke_paths) or 1) as pool:
+                results = pool.map(lambda p: (p, *self._run(["-c", _SMOKE_SCRIPT, p], scratch)),
+                                   self.smoke_paths)
+                failures = [f"{path}: {output}" for path, ok, output in results if not ok]
+            if failures:
+                raise PatchError("smoke", "\n".join(failures))
+
+    def swap(self, changes):
+        """Replace each file atomically: write a sibling temp file, fsync, os.replace."""
+        for relative, content in changes.items():
+            path = os.path.join(self.root, relative)
+            directory = os.path.dirname(path)
+            fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(content)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if os.path.exists(path):
+                    shutil.copymode(path, tmp_path)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+    def run(self, patch_text, target=None):
+        """Parse, apply, validate and swap in a patch. Returns a PatchResult."""
+        try:
+            changes = self.prepare(patch_text, target)
+            self.validate(changes)
+            self.swap(changes)
+        except PatchError as e:
+            logger.warning(f"Patch rejected at {e.stage}: {e.detail[:200]}")
+            return PatchResult(False, e.stage, e.detail)
+        except OSError as e:
+            logger.error(f"Patch failed: {e}")
+            return PatchResult(False, "io", str(e))
+        logger.info(f"Patch applied to {', '.join(changes)}")
+        return PatchResult(True, "swap", files=changes)
@@ -0,0 +1,189 @@
+"""
+Pre-generate explanations for every question x option in questions/*.json.
+
+Results go into the same SQLite store the /answer route reads from
+(instance/explanations.db), so known questions never wait on the model.
+Entries that already exist are skipped, so the run can be interrupted
+and started again at any time.
+
+Usage:
+    python pregenerate.py [--workers 4] [--language python] [--dry-run]
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from explanation_cache import ExplanationCache, explanation_key
+from explainer import request_explanation
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+QUESTIONS_DIR = os.path.join(BASE_DIR, "questions")
+CACHE_DB = os.path.join(BASE_DIR, "instance", "explanations.db")
+
+logger = logging.getLogger("pregenerate")
+
+
+# ---------------------------
+# Work items
+# ---------------------------
+def iter_jobs(questions_dir=QUESTIONS_DIR, languages=None):
+    """Yield (language, question, selected_option) for every question in every bank."""
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(questions_dir, "*.json"))):
+        language = os.path.splitext(os.path.basename(path))[0]
+        if languages and language not in languages:
+            continue
+        with open(path) as f:
+            questions = json.load(f)
+        for q in questions:
+            for option in q.get("options", []):
+                # Duplicate questions share one cache entry
+                key = explanation_key(q["question"], q.get("options", []), q.get("answer"), option)
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield language, q, option
+
+
+def is_rate_limit(error):
+    """True for 429s / rate limit errors from the OpenAI client (or a stub of it)."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, if it sent a Retry-After header."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------------------
+# Runner
+# ---------------------------
+class Pregenerator:
+    """Runs explanation jobs on a bounded worker pool with shared rate-limit backoff."""
+
+    def __init__(self, client, cache, workers=4, max_retries=5, base_delay=1.0, max_delay=60.0):
+        self.client = client
+        self.cache = cache
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # When one worker is rate limited, every worker waits until this time
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+        self.counts = {"generated": 0, "skipped": 0, "failed": 0}
+
+    def _wait_for_backoff(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _back_off(self, attempt, error):
+        delay = retry_after(error)
+        if delay is None:
+            delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+            delay = random.uniform(delay / 2, delay)
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+        logger.warning(f"Rate limited, pausing workers for {delay:.1f}s")
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def run_job(self, question, selected):
+        text = question["question"]
+        options = question.get("options", [])
+        correct = question.get("answer")
+        key = explanation_key(text, options, correct, selected)
+
+        if self.cache.contains(key):
+            self._count("skipped")
+            return
+
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_backoff()
+            try:
+                explanation = request_explanation(self.client, text, selected, correct, options)
+            except Exception as e:
+                if is_rate_limit(e) and attempt < self.max_retries:
+                    self._back_off(attempt, e)
+                    continue
+                logger.error(f"Failed to generate explanation for {text!r} / {selected!r}: {e}")
+                self._count("failed")
+                return
+
+            if explanation:
+                self.cache.put(key, text, explanation)
+                self._count("generated")
+            else:
+                self._count("failed")
+            return
+
+    def run(self, jobs):
+        jobs = list(jobs)
+        logger.info(f"{len(jobs)} question/option pairs to check")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(self.run_job, q, option) for _, q, option in jobs]
+            for future in as_completed(futures):
+                future.result()
+        return self.counts
+
+
+def pending_jobs(cache, jobs):
+    """Jobs whose explanation is not in the store yet."""
+    return [
+        (language, q, option) for language, q, option in jobs
+        if not cache.contains(explanation_key(q["question"], q.get("options", []), q.get("answer"), option))
+    ]
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate quiz explanations.")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent model requests")
+    parser.add_argument("--language", action="append", help="Only this bank (repeatable)")
+    parser.add_argument("--questions-dir", default=QUESTIONS_DIR)
+    parser.add_argument("--db", default=CACHE_DB, help="Explanation store to fill")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what is missing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    cache = ExplanationCache(args.db)
+    jobs = list(iter_jobs(args.questions_dir, args.language))
+
+    if args.dry_run:
+        missing = pending_jobs(cache, jobs)
+        print(f"{len(missing)} of {len(jobs)} explanations missing")
+        return 0
+
+    from openai import OpenAI
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY not set in environment!")
+    # Retries are handled here so the pool can back off as a whole
+    client = OpenAI(api_key=api_key, max_retries=0)
+
+    counts = Pregenerator(client, cache, workers=args.workers).run(jobs)
+    print(f"generated={counts['generated']} skipped={counts['skipped']} failed={counts['failed']}")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,336 @@
+"""
+Opt-in request profiling (QUIZ_PROFILING=1).
+
+ProfilerMiddleware wraps app.wsgi_app and times each request from the
+first byte in to the last byte out (so streamed answers count in full).
+Named spans break that time down:
+
+    model     calls through the model gateway (wrapped with `instrument`)
+    db        SQLAlchemy statements (`watch_sqlalchemy`)
+    template  Jinja rendering (Flask's template signals)
+    other     whatever is left: JSON parsing, prompt building, post-processing...
+
+Spans follow the request into worker threads that were started with
+contextvars.copy_context() (the explanation engine does this).
+
+For a closer look at a route, turn on sampling for it: a background thread
+reads the stacks of the threads serving that route every `sample_interval`
+seconds through sys._current_frames() and counts them in collapsed-stack
+form ("route;file:func;file:func count"), ready for flamegraph.pl or
+speedscope. Nothing is sampled while no route is enabled.
+
+Numbers are per process. Under gevent workers the sampler only sees the
+hub thread, so use span timings there.
+"""
+import contextvars
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from werkzeug.wsgi import ClosingIterator
+
+_current = contextvars.ContextVar("quiz_request_profile", default=None)
+
+MAX_STACKS = 20000
+
+
+class RequestProfile:
+    __slots__ = ("route", "method", "path", "started_at", "started", "duration", "status", "spans", "_open")
+
+    def __init__(self, route, method, path):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.status = None
+        self.spans = defaultdict(float)
+        self._open = True
+
+    def add(self, name, seconds):
+        # Background work that outlives the request (e.g. a slow model call) isn't charged to it
+        if self._open:
+            self.spans[name] += seconds
+
+    def to_dict(self):
+        spans = {name: round(seconds * 1000, 2) for name, seconds in self.spans.items()}
+        if self.duration is not None:
+            spans["other"] = round(max(self.duration - sum(self.spans.values()), 0) * 1000, 2)
+        return {
+            "route": self.route,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started_at)),
+            "duration_ms": round((self.duration or 0) * 1000, 2),
+            "spans_ms": spans,
+        }
+
+
+def add_span(name, seconds):
+    profile = _current.get()
+    if profile is not None:
+        profile.add(name, seconds)
+
+
+@contextmanager
+def span(name):
+    """Time a block as part of the current request (a no-op outside one)."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - started)
+
+
+def _timed_iterator(iterator, name, profile):
+    """Charge the time spent waiting on each item of a stream to `name`."""
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                if profile is not None:
+                    profile.add(name, time.perf_counter() - started)
+            yield item
+    finally:
+        # Pass an early close on, so the gateway releases its slot right away
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+class Profiler:
+    def __init__(self, app, slow_requests=20, sample_interval=0.005):
+        self.app = app
+        self.slow_requests = slow_requests
+        self.sample_interval = sample_interval
+        self._slowest = []  # min-heap of (duration, seq, profile dict)
+        self._seq = itertools.count()
+        self._routes = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0, "spans": defaultdict(float)})
+        self._active = {}  # thread ident -> RequestProfile
+        self._sampled_routes = set()
+        self._stacks = defaultdict(int)
+        self._lock = threading.Lock()
+        self._sampler_pid = None
+        self._sampler_wake = threading.Event()
+
+        app.wsgi_app = ProfilerMiddleware(app.wsgi_app, self)
+        self._watch_templates()
+
+    # ---------------------------
+    # Instrumentation
+    # ---------------------------
+    def instrument(self, namespace, attr, span_name):
+        """Wrap namespace.attr so its calls (and streamed results) count as `span_name`."""
+        original = getattr(namespace, attr)
+
+        def wrapped(*args, **kwargs):
+            profile = _current.get()
+            started = time.perf_counter()
+            try:
+                result = original(*args, **kwargs)
+            finally:
+                if profile is not None:
+                    profile.add(span_name, time.perf_counter() - started)
+            if kwargs.get("stream"):
+                return _timed_iterator(iter(result), span_name, profile)
+            return result
+
+        setattr(namespace, attr, wrapped)
+
+    def watch_sqlalchemy(self, engine_class):
+        from sqlalchemy import event
+
+        @event.listens_for(engine_class, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("quiz_query_started", []).append(time.perf_counter())
+
+        @event.listens_for(engine_class, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            started = conn.info.get("quiz_query_started")
+            if started:
+                add_span("db", time.perf_counter() - started.pop())
+
+    def _watch_templates(self):
+        from flask import before_render_template, template_rendered
+        starts = threading.local()
+
+        def _before(sender, template, context, **extra):
+            starts.__dict__.setdefault("stack", []).append(time.perf_counter())
+
+        def _after(sender, template, context, **extra):
+            stack = getattr(starts, "stack", None)
+            if stack:
+                add_span("template", time.perf_counter() - stack.pop())
+
+        before_render_template.connect(_before, self.app, weak=False)
+        template_rendered.connect(_after, self.app, weak=False)
+
+    # ---------------------------
+    # Request bookkeeping
+    # ---------------------------
+    def route_for(self, environ):
+        try:
+            rule, _ = self.app.url_map.bind_to_environ(environ).match(return_rule=True)
+            return rule.rule
+        except Exception:
+            return "<unmatched>"
+
+    def begin(self, profile):
+        with self._lock:
+            self._active[threading.get_ident()] = profile
+
+    def finish(self, profile):
+        profile.duration = time.perf_counter() - profile.started
+        profile._open = False
+        entry = profile.to_dict()
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            route = self._routes[profile.route]
+            route["count"] += 1
+            route["total"] += profile.duration
+            route["max"] = max(route["max"], profile.duration)
+            for name, seconds in profile.spans.items():
+                route["spans"][name] += seconds
+
+            item = (profile.duration, next(self._seq), entry)
+            if len(self._slowest) < self.slow_requests:
+                heapq.heappush(self._slowest, item)
+            elif item[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, item)
+
+    # ---------------------------
+    # Sampling
+    # ---------------------------
+    def set_sampling(self, route, enabled=True):
+        with self._lock:
+            if enabled:
+                self._sampled_routes.add(route)
+            else:
+                self._sampled_routes.discard(route)
+        if enabled:
+            self._ensure_sampler()
+            self._sampler_wake.set()
+
+    def _ensure_sampler(self):
+        if self._sampler_pid == os.getpid():
+            return
+        self._sampler_pid = os.getpid()
+        threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True).start()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while True:
+            if not self._sampled_routes:
+                self._sampler_wake.clear()
+                self._sampler_wake.wait()
+            time.sleep(self.sample_interval)
+
+            with self._lock:
+                targets = {ident: p.route for ident, p in self._active.items() if p.route in self._sampled_routes}
+            if not targets:
+                continue
+
+            frames = sys._current_frames()
+            for ident, route in targets.items():
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                key = ";".join([route] + stack[::-1])
+                with self._lock:
+                    if key in self._stacks or len(self._stacks) < MAX_STACKS:
+                        self._stacks[key] += 1
+
+    # ---------------------------
+    # Reports
+    # ---------------------------
+    def slowest(self):
+        with self._lock:
+            return [entry for _, _, entry in sorted(self._slowest, reverse=True)]
+
+    def routes(self):
+        with self._lock:
+            return {
+                route: {
+                    "count": r["count"],
+                    "avg_ms": round(r["total"] / r["count"] * 1000, 2),
+                    "max_ms": round(r["max"] * 1000, 2),
+                    "spans_avg_ms": {name: round(s / r["count"] * 1000, 2) for name, s in r["spans"].items()},
+                }
+                for route, r in self._routes.items() if r["count"]
+            }
+
+    def collapsed(self, route=None):
+        """Collapsed stacks ("frame;frame;frame count" per line) for flamegraph tools."""
+        with self._lock:
+            items = sorted(self._stacks.items())
+        return "".join(
+            f"{stack} {count}\n" for stack, count in items
+            if route is None or stack.split(";", 1)[0] == route
+        )
+
+    def reset(self):
+        with self._lock:
+            self._slowest.clear()
+            self._routes.clear()
+            self._stacks.clear()
+
+    def stats(self):
+        return {
+            "slowest": self.slowest(),
+            "routes": self.routes(),
+            "sampling": sorted(self._sampled_routes),
+            "stacks": len(self._stacks),
+        }
+
+
+class ProfilerMiddleware:
+    def __init__(self, wsgi_app, profiler):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ, start_response):
+        profile = RequestProfile(
+            self.profiler.route_for(environ), environ.get("REQUEST_METHOD", "GET"), environ.get("PATH_INFO", "")
+        )
+        token = _current.set(profile)
+        self.profiler.begin(profile)
+
+        def _start_response(status, headers, exc_info=None):
+            profile.status = int(status.split(" ", 1)[0])
+            return start_response(status, headers, exc_info)
+
+        def _finish():
+            self.profiler.finish(profile)
+            try:
+                _current.reset(token)
+            except ValueError:
+                # Closed from a different context than the one that started the request
+                _current.set(None)
+
+        try:
+            app_iter = self.wsgi_app(environ, _start_response)
+        except BaseException:
+            _finish()
+            raise
+        # Finish when the server closes the body, so streamed responses are timed in full
+        return ClosingIterator(app_iter, [_finish])
@@ -0,0 +1,277 @@
+"""
+Compiled question banks: questions/<language>.qbank, built from the JSON.
+
+JSON stays the authoring format. The build step (run by the Dockerfile, or
+by hand after editing a bank)
+
+    python question_bank.py                  # every questions/*.json
+    python question_bank.py --info questions/python.qbank
+
+writes a binary file that is opened with mmap, so a worker only decodes
+the records it touches and every worker shares the same pages through the
+OS page cache. Sampling k questions picks k record numbers and decodes those
+k records; the rest of the bank is never read.
+
+Layout (little-endian):
+
+    header    magic "QUIZBANK", version u16, reserved u16, count u32,
+              source mtime_ns u64, source size u64,
+              offsets position u64, index position u64, records position u64
+    offsets   (count + 1) u64: record i is records[offsets[i]:offsets[i + 1]]
+    index     count x (6-byte question id, u32 record number), sorted by id
+    records   text_len u32, answer_len u32 (NO_ANSWER for null), explanation_len u32,
+              option_count u16, text, answer, explanation,
+              then option_count x (len u32, option)
+
+The header records the size and mtime of the JSON it was built from.
+QuestionRepository only uses a compiled bank while they still match, and
+otherwise falls back to the JSON, so a stale build is never served.
+"""
+import argparse
+import json
+import mmap
+import os
+import random
+import struct
+
+from question_repository import Question, question_id
+
+MAGIC = b"QUIZBANK"
+VERSION = 1
+SUFFIX = ".qbank"
+NO_ANSWER = 0xFFFFFFFF
+
+HEADER = struct.Struct("<8sHHIQQQQQ")
+OFFSET = struct.Struct("<Q")
+INDEX_ENTRY = struct.Struct("<6sI")
+RECORD_HEADER = struct.Struct("<IIIH")
+LENGTH = struct.Struct("<I")
+
+QUESTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "questions")
+
+
+def compiled_path(json_path):
+    return os.path.splitext(json_path)[0] + SUFFIX
+
+
+def _encode(entry):
+    text = entry["question"].encode("utf-8")
+    answer = entry.get("answer")
+    answer = None if answer is None else str(answer).encode("utf-8")
+    explanation = (entry.get("explanation") or "").encode("utf-8")
+    options = [str(option).encode("utf-8") for option in entry.get("options", [])]
+
+    parts = [
+        RECORD_HEADER.pack(len(text), NO_ANSWER if answer is None else len(answer), len(explanation), len(options)),
+        text, answer or b"", explanation,
+    ]
+    for option in options:
+        parts.append(LENGTH.pack(len(option)))
+        parts.append(option)
+    return b"".join(parts)
+
+
+def build(json_path, output_path=None):
+    """Compile one JSON bank; returns (output path, question count)."""
+    language = os.path.splitext(os.path.basename(json_path))[0]
+    output_path = output_path or compiled_path(json_path)
+    st = os.stat(json_path)
+    with open(json_path) as f:
+        raw = json.load(f)
+
+    records = []
+    index = []
+    seen = set()
+    for entry in raw:
+        qid = question_id(language, entry["question"])
+        # Same rule as QuestionBank: repeated questions keep their first copy
+        if qid in seen:
+            continue
+        seen.add(qid)
+        index.append((bytes.fromhex(qid), len(records)))
+        records.append(_encode(entry))
+    index.sort()
+
+    count = len(records)
+    offsets_pos = HEADER.size
+    index_pos = offsets_pos + OFFSET.size * (count + 1)
+    records_pos = index_pos + INDEX_ENTRY.size * count
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, count, st.st_mtime_ns, st.st_size,
+                            offsets_pos, index_pos, records_pos))
+        position = 0
+        for record in records:
+            f.write(OFFSET.pack(position))
+            position += len(record)
+        f.write(OFFSET.pack(position))
+        for qid, number in index:
+            f.write(INDEX_ENTRY.pack(qid, number))
+        for record in records:
+            f.write(record)
+        f.flush()
+        os.fsync(f.fileno())
+    # Readers that still have the old file mapped keep their (old) inode
+    os.replace(tmp_path, output_path)
+    return output_path, count
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        data = f.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is too short to be a compiled bank")
+    magic, version, _, count, mtime_ns, size, offsets_pos, index_pos, records_pos = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a compiled question bank")
+    if version != VERSION:
+        raise ValueError(f"{path} has format version {version}, expected {VERSION}")
+    return {
+        "count": count, "source_mtime_ns": mtime_ns, "source_size": size,
+        "offsets_pos": offsets_pos, "index_pos": index_pos, "records_pos": records_pos,
+    }
+
+
+def is_current(path, json_path):
+    """True when the compiled bank was built from the JSON as it is now (or there's no JSON)."""
+    try:
+        header = read_header(path)
+    except (OSError, ValueError):
+        return False
+    try:
+        st = os.stat(json_path)
+    except OSError:
+        return True
+    return (header["source_mtime_ns"], header["source_size"]) == (st.st_mtime_ns, st.st_size)
+
+
+class CompiledBank:
+    """
+    Read-only view of a .qbank file. Same queries as QuestionBank, but
+    records are decoded on access instead of all being held as objects.
+    The last `cache_size` decoded questions are kept, so popular ones aren't
+    decoded (and their IDs hashed) again on every request.
+    """
+
+    def __init__(self, language, path, cache_size=4096):
+        self.language = language
+        self.path = path
+        self.cache_size = cache_size
+        self._decoded = {}
+        self.mtime = os.path.getmtime(path)
+
+        header = read_header(path)
+        self.count = header["count"]
+        self._offsets_pos = header["offsets_pos"]
+        self._index_pos = header["index_pos"]
+        self._records_pos = header["records_pos"]
+
+        with open(path, "rb") as f:
+            # The mapping stays valid after the file is closed (and after os.replace)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        end = self._records_pos + self._offset(self.count) if self.count else self._records_pos
+        if len(self._mm) < end:
+            raise ValueError(f"{path} is truncated")
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, number):
+        return OFFSET.unpack_from(self._mm, self._offsets_pos + OFFSET.size * number)[0]
+
+    def question(self, number):
+        """Record `number` as a Question, decoded on first use."""
+        q = self._decoded.get(number)
+        if q is None:
+            q = self._decode(number)
+            if len(self._decoded) >= self.cache_size:
+                self._decoded.clear()
+            self._decoded[number] = q
+        return q
+
+    def _decode(self, number):
+        mm = self._mm
+        position = self._records_pos + self._offset(number)
+        text_len, answer_len, explanation_len, option_count = RECORD_HEADER.unpack_from(mm, position)
+        position += RECORD_HEADER.size
+
+        text = mm[position:position + text_len].decode("utf-8")
+        position += text_len
+        answer = None
+        if answer_len != NO_ANSWER:
+            answer = mm[position:position + answer_len].decode("utf-8")
+            position += answer_len
+        explanation = mm[position:position + explanation_len].decode("utf-8")
+        position += explanation_len
+
+        options = []
+        for _ in range(option_count):
+            (length,) = LENGTH.unpack_from(mm, position)
+            position += LENGTH.size
+            options.append(mm[position:position + length].decode("utf-8"))
+            position += length
+        return Question(self.language, text, options, answer, explanation)
+
+    def _find(self, qid):
+        """Record number for a question ID (binary search over the sorted index), or None."""
+        try:
+            target = bytes.fromhex(qid)
+        except (TypeError, ValueError):
+            return None
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key, number = INDEX_ENTRY.unpack_from(self._mm, self._index_pos + INDEX_ENTRY.size * mid)
+            if key == target:
+                return number
+            if key < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    # ---------------------------
+    # Queries (same as QuestionBank)
+    # ---------------------------
+    def get(self, qid):
+        number = self._find(qid)
+        return None if number is None else self.question(number)
+
+    def find_by_text(self, question_text):
+        # IDs are derived from the text, so the index answers text lookups too
+        q = self.get(question_id(self.language, question_text))
+        return q if q is not None and q.text.strip() == question_text.strip() else None
+
+    def sample(self, k, rng=random):
+        # rng.sample over a range doesn't build a list, and picks the same positions
+        # for a given seed as sampling the JSON bank's list does
+        return [self.question(number) for number in rng.sample(range(self.count), min(k, self.count))]
+
+    def __iter__(self):
+        # A full scan would only push the popular questions out of the cache
+        for number in range(self.count):
+            yield self._decode(number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile questions/*.json into memory-mappable .qbank files.")
+    parser.add_argument("paths", nargs="*", help="JSON banks to compile (default: every questions/*.json)")
+    parser.add_argument("--info", metavar="QBANK", help="print the header of a compiled bank and exit")
+    args = parser.parse_args()
+
+    if args.info:
+        header = read_header(args.info)
+        print(json.dumps(dict(header, size=os.path.getsize(args.info)), indent=2))
+        return
+
+    paths = args.paths or sorted(
+        os.path.join(QUESTIONS_DIR, name) for name in os.listdir(QUESTIONS_DIR) if name.endswith(".json")
+    )
+    for json_path in paths:
+        output_path, count = build(json_path)
+        print(f"{json_path} -> {output_path} ({count} questions, {os.path.getsize(output_path)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def question_id(language, question_text):
+    """Stable ID for a question: same language + text always gives the same ID."""
+    raw = f"{language}:{question_text.strip()}".encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+class Question:
+    """One parsed question. __slots__ keeps thousands of these cheap."""
+
+    __slots__ = ("id", "language", "text", "options", "answer", "explanation")
+
+    def __init__(self, language, text, options, answer, explanation=""):
+        self.id = question_id(language, text)
+        self.language = language
+        self.text = text
+        self.options = tuple(options)
+        self.answer = answer
+        self.explanation = explanation or ""
+
+    def to_dict(self):
+        """Same shape as the entries in questions/*.json, plus the stable ID."""
+        return {
+            "id": self.id,
+            "question": self.text,
+            "options": list(self.options),
+            "answer": self.answer,
+            "explanation": self.explanation,
+        }
+
+
+class QuestionBank:
+    """All questions of one language plus its lookup indexes."""
+
+    __slots__ = ("language", "path", "mtime", "questions", "by_id", "by_text")
+
+    def __init__(self, language, path):
+        self.language = language
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+
+        with open(path) as f:
+            raw = json.load(f)
+
+        self.questions = []
+        self.by_id = {}
+        self.by_text = {}
+        for entry in raw:
+            q = Question(
+                language,
+                entry["question"],
+                entry.get("options", []),
+                entry.get("answer"),
+                entry.get("explanation", ""),
+            )
+            # The banks contain a few repeated questions; keep the first copy
+            if q.id in self.by_id:
+                continue
+            self.questions.append(q)
+            self.by_id[q.id] = q
+            self.by_text[q.text.strip()] = q
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __iter__(self):
+        return iter(self.questions)
+
+    def get(self, qid):
+        return self.by_id.get(qid)
+
+    def find_by_text(self, question_text):
+        return self.by_text.get(question_text.strip())
+
+    def sample(self, k, rng=random):
+        return rng.sample(self.questions, min(k, len(self.questions)))
+
+
+class QuestionRepository:
+    """
+    Parses every questions/<language>.json once and serves lookups from memory.
+    A bank is re-parsed only when its file's mtime changes; the file system is
+    checked at most once every `check_interval` seconds.
+
+    When questions/<language>.qbank (see question_bank.py) was built from the
+    current JSON, and the JSON is at least `compiled_min_bytes`, that compiled
+    bank is memory-mapped instead, and records are decoded only as they are
+    asked for. Smaller banks are cheaper to hold as parsed objects.
+    """
+
+    def __init__(self, questions_dir, check_interval=2.0, compiled_min_bytes=1024 * 1024):
+        self.questions_dir = questions_dir
+        self.check_interval = check_interval
+        self.compiled_min_bytes = compiled_min_bytes
+        self._banks = {}
+        self._stale = set()  # compiled banks already reported as out of date
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._refresh(force=True)
+
+    # ---------------------------
+    # Loading
+    # ---------------------------
+    def _refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return
+
+        with self._lock:
+            if not force and now - self._last_check < self.check_interval:
+                return
+            self._last_check = now
+
+            banks = dict(self._banks)
+            found = set()
+            filenames = set(os.listdir(self.questions_dir))
+            for filename in sorted(filenames):
+                language, ext = os.path.splitext(filename)
+                if ext == ".qbank" and language + ".json" in filenames:
+                    continue
+                if ext not in (".json", ".qbank"):
+                    continue
+                path = self._bank_path(language, language + ".qbank" in filenames)
+                found.add(language)
+                current = banks.get(language)
+                try:
+                    if current is None or path != current.path or os.path.getmtime(path) != current.mtime:
+                        banks[language] = self._load(language, path)
+                except (OSError, ValueError) as e:
+                    # Keep serving the last good copy while a bank is being edited
+                    logger.error(f"Failed to load question bank {path}: {e}")
+                    if current is None:
+                        found.discard(language)
+
+            for language in list(banks):
+                if language not in found:
+                    del banks[language]
+
+            # Swap in one step so readers never see a half-built mapping
+            self._banks = banks
+
+    def _bank_path(self, language, has_compiled):
+        json_path = os.path.join(self.questions_dir, language + ".json")
+        if not has_compiled:
+            return json_path
+        from question_bank import is_current  # question_bank imports this module
+        compiled = os.path.join(self.questions_dir, language + ".qbank")
+        if os.path.exists(json_path) and os.path.getsize(json_path) < self.compiled_min_bytes:
+            return json_path
+        if not os.path.exists(json_path) or is_current(compiled, json_path):
+            self._stale.discard(compiled)
+            return compiled
+        if compiled not in self._stale:
+            self._stale.add(compiled)
+            logger.warning(f"{compiled} wasn't built from the current {json_path}; using the JSON until it is rebuilt")
+        return json_path
+
+    @staticmethod
+    def _load(language, path):
+        if path.endswith(".qbank"):
+            from question_bank import CompiledBank
+            return CompiledBank(language, path)
+        return QuestionBank(language, path)
+
+    def _bank(self, language):
+        self._refresh()
+        return self._banks.get(language)
+
+    # ---------------------------
+    # Queries
+    # ---------------------------
+    def languages(self):
+        self._refresh()
+        return sorted(self._banks)
+
+    def has_language(self, language):
+        return self._bank(language) is not None
+
+    def all(self, language):
+        bank = self._bank(language)
+        return list(bank) if bank is not None else []
+
+    def get(self, language, qid):
+        bank = self._bank(language)
+        return bank.get(qid) if bank is not None else None
+
+    def find_by_text(self, language, question_text):
+        bank = self._bank(language)
+        if bank is None or not question_text:
+            return None
+        return bank.find_by_text(question_text)
+
+    def sample(self, language, k, rng=random):
+        bank = self._bank(language)
+        if bank is None:
+            raise KeyError(language)
+        return bank.sample(k, rng)
+
+    def iter_all(self):
+        self._refresh()
+        for bank in list(self._banks.values()):
+            yield from bank
@@ -0,0 +1,156 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+
+class QuizSession:
+    """A quiz in progress: a fixed ordering of question IDs for one language."""
+
+    __slots__ = ("token", "language", "question_ids", "created_at")
+
+    def __init__(self, token, language, question_ids, created_at=None):
+        self.token = token
+        self.language = language
+        self.question_ids = list(question_ids)
+        self.created_at = created_at or time.time()
+
+    @classmethod
+    def create(cls, repo, language, num_questions=10):
+        """Sample a new quiz from the repository."""
+        questions = repo.sample(language, num_questions)
+        return cls(secrets.token_urlsafe(16), language, [q.id for q in questions])
+
+    def question_id(self, index):
+        if 0 <= index < len(self.question_ids):
+            return self.question_ids[index]
+        return None
+
+    def to_dict(self):
+        return {
+            "token": self.token,
+            "language": self.language,
+            "question_ids": self.question_ids,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        # Sessions saved before seed/answers were dropped still load: extra keys are ignored
+        return cls(data["token"], data["language"], data["question_ids"], data.get("created_at"))
+
+
+# ---------------------------
+# Session Stores
+# ---------------------------
+class MemorySessionStore:
+    """Dict-backed store with expiry. Only shared by threads of one process."""
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._last_purge = time.monotonic()
+
+    def _purge(self):
+        now = time.time()
+        if time.monotonic() - self._last_purge < 60:
+            return
+        self._last_purge = time.monotonic()
+        for token, (_, expires_at) in list(self._sessions.items()):
+            if expires_at < now:
+                self._sessions.pop(token, None)
+
+    def save(self, session):
+        with self._lock:
+            self._sessions[session.token] = (session.to_dict(), time.time() + self.ttl)
+            self._purge()
+
+    def get(self, token):
+        if not token:
+            return None
+        with self._lock:
+            item = self._sessions.get(token)
+            if item is None:
+                return None
+            data, expires_at = item
+            if expires_at < time.time():
+                del self._sessions[token]
+                return None
+            return QuizSession.from_dict(data)
+
+    def delete(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
+
+
+class SQLiteSessionStore:
+    """SQLite-backed store, shared by every worker process on the host."""
+
+    def __init__(self, db_path, ttl=3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._last_purge = 0.0
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS quiz_sessions (
+                token TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_quiz_sessions_expiry ON quiz_sessions(expires_at)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def save(self, session):
+        conn = self._conn()
+        now = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO quiz_sessions (token, data, expires_at) VALUES (?, ?, ?)",
+            (session.token, json.dumps(session.to_dict()), now + self.ttl),
+        )
+        if now - self._last_purge > 60:
+            self._last_purge = now
+            conn.execute("DELETE FROM quiz_sessions WHERE expires_at < ?", (now,))
+        conn.commit()
+
+    def get(self, token):
+        if not token:
+            return None
+        row = self._conn().execute(
+            "SELECT data, expires_at FROM quiz_sessions WHERE token = ?", (token,)
+        ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return QuizSession.from_dict(json.loads(row[0]))
+
+    def delete(self, token):
+        conn = self._conn()
+        conn.execute("DELETE FROM quiz_sessions WHERE token = ?", (token,))
+        conn.commit()
+
+
+def create_session_store(kind, instance_path, ttl=3600):
+    """Build the store named by QUIZ_SESSION_STORE ("sqlite" or "memory")."""
+    if kind == "memory":
+        return MemorySessionStore(ttl=ttl)
+    if kind == "sqlite":
+        return SQLiteSessionStore(os.path.join(instance_path, "sessions.db"), ttl=ttl)
+    raise ValueError(f"Unknown session store: {kind}")
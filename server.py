@@ -2,22 +2,216 @@ import subprocess
 import sys
 import time
 import os
+import select
+import signal
+import socket
+import threading
 
 APP_PATH = "app.py"
+HOST = "0.0.0.0"
+PORT = int(os.environ.get("PORT", 5001))
 
-def start_app():
-    print("🔄 Starting Flask app...")
-    # stdout/stderr inherited so you see crashes in console
-    return subprocess.Popen([sys.executable, APP_PATH])
+READY_TIMEOUT = 60      # seconds a new process gets to pass its health check
+GRACE_PERIOD = 30       # seconds an old process gets to finish in-flight requests
+BACKOFF_START = 1       # first crash-restart delay, doubled on every quick crash
+BACKOFF_MAX = 60
+STABLE_AFTER = 30       # a process that lived this long resets the backoff
 
-if __name__ == "__main__":
-    while True:
-        process = start_app()
-        return_code = process.wait()
 
-        print("\n❌ Flask app crashed (exit code {}).".format(return_code))
-        
-        # Wait a moment before restarting
-        time.sleep(2)
+# ---------------------------
+# Supervisor (parent)
+# ---------------------------
+class RollingSupervisor:
+    """
+    Keeps one app process serving on a listening socket that the supervisor
+    owns, so the port never closes:
+
+    - rolling_restart() starts a new process on the same socket, waits for it
+      to report healthy, then asks the old one to stop accepting and drain
+      (SIGTERM), killing it only after GRACE_PERIOD
+    - a process that dies on its own is replaced, with exponential backoff
+      if it keeps crashing
+    """
+
+    def __init__(self, command=None, host=HOST, port=PORT):
+        self.command = command or [sys.executable, APP_PATH]
+        self.host = host
+        self.port = port
+        self.sock = None
+        self.process = None
+        self.restarts = 0
+        self._lock = threading.RLock()
+        self._stopping = False
+        self._started_at = 0.0
+        self.serving_since = None  # wall-clock start of the current process
+        self._backoff = BACKOFF_START
+
+    def _listen(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(128)
+        sock.set_inheritable(True)
+        return sock
+
+    def _spawn(self):
+        """Start a process on the shared socket; return it once healthy, else None."""
+        ready_r, ready_w = os.pipe()
+        env = dict(os.environ, QUIZ_LISTEN_FD=str(self.sock.fileno()), QUIZ_READY_FD=str(ready_w))
+        print("🔄 Starting Flask app...")
+        # stdout/stderr inherited so you see crashes in console
+        proc = subprocess.Popen(self.command, env=env, pass_fds=(self.sock.fileno(), ready_w))
+        os.close(ready_w)
+
+        try:
+            ready, _, _ = select.select([ready_r], [], [], READY_TIMEOUT)
+            message = os.read(ready_r, 64) if ready else b""
+        finally:
+            os.close(ready_r)
+
+        if message.startswith(b"ready"):
+            print(f"✅ Flask app ready (pid {proc.pid}).")
+            return proc
+
+        print(f"❌ New Flask process {proc.pid} failed its health check.")
+        self._stop_process(proc, grace=5)
+        return None
+
+    @staticmethod
+    def _stop_process(proc, grace=GRACE_PERIOD):
+        """SIGTERM (stop accepting, finish in-flight requests), then SIGKILL after `grace`."""
+        if proc.poll() is not None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(grace)
+        except subprocess.TimeoutExpired:
+            print(f"⚠️  Process {proc.pid} still busy after {grace}s, killing it.")
+            proc.kill()
+            proc.wait()
+
+    def start(self):
+        """Bind the socket, start the first process and watch it in the background."""
+        self.sock = self._listen()
+        with self._lock:
+            while self.process is None:
+                self.process = self._spawn()
+                if self.process is None:
+                    self._sleep_backoff()
+            self._started_at = time.monotonic()
+            self.serving_since = time.time()
+        threading.Thread(target=self._monitor, name="supervisor", daemon=True).start()
+
+        if threading.current_thread() is threading.main_thread():
+            # app.py sends SIGHUP after applying a patch (see reload_after_patch)
+            signal.signal(signal.SIGHUP, lambda *_: threading.Thread(
+                target=self.rolling_restart, name="rolling-restart", daemon=True).start())
+
+    def rolling_restart(self):
+        """Replace the running process without closing the port. Returns True on success."""
+        with self._lock:
+            new = self._spawn()
+            if new is None:
+                print("🩺 Keeping the current process; new one was not healthy.")
+                return False
+            old, self.process = self.process, new
+            self._started_at = time.monotonic()
+            self.serving_since = time.time()
+            self.restarts += 1
+
+        # Drain outside the lock so a crash of the new process can still be handled
+        if old is not None:
+            threading.Thread(target=self._stop_process, args=(old,), daemon=True).start()
+        return True
+
+    def _sleep_backoff(self):
+        print(f"⏳ Waiting {self._backoff}s before restarting.")
+        time.sleep(self._backoff)
+        self._backoff = min(self._backoff * 2, BACKOFF_MAX)
 
-        print("🩺 Attempting auto-restart...\n")
\ No newline at end of file
+    def _monitor(self):
+        while not self._stopping:
+            proc = self.process
+            return_code = proc.wait()
+            if self._stopping:
+                return
+            with self._lock:
+                if proc is not self.process:
+                    # Replaced by a rolling restart; the old one exiting is expected
+                    continue
+                print("\n❌ Flask app crashed (exit code {}).".format(return_code))
+                if time.monotonic() - self._started_at >= STABLE_AFTER:
+                    self._backoff = BACKOFF_START
+                self._sleep_backoff()
+                print("🩺 Attempting auto-restart...\n")
+                new = None
+                while new is None and not self._stopping:
+                    new = self._spawn()
+                    if new is None:
+                        self._sleep_backoff()
+                self.process = new
+                self._started_at = time.monotonic()
+                self.serving_since = time.time()
+                self.restarts += 1
+
+    def stop(self):
+        self._stopping = True
+        if self.process is not None:
+            self._stop_process(self.process)
+        if self.sock is not None:
+            self.sock.close()
+
+    def run(self):
+        """Run until interrupted. SIGHUP triggers a rolling restart."""
+        self.start()
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            while True:
+                time.sleep(1)
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            self.stop()
+
+
+# ---------------------------
+# App process (child)
+# ---------------------------
+def serve_inherited(app):
+    """
+    Serve `app` on the socket handed down by RollingSupervisor. The process
+    checks its own /health before accepting connections, tells the supervisor
+    it is ready, and on SIGTERM stops accepting and finishes in-flight
+    requests before exiting.
+    """
+    from werkzeug.serving import make_server
+
+    fd = int(os.environ["QUIZ_LISTEN_FD"])
+    ready_fd = int(os.environ.get("QUIZ_READY_FD", -1))
+
+    with app.test_client() as client:
+        status = client.get("/health").status_code
+    if status != 200:
+        print(f"❌ /health returned {status}, not accepting traffic.")
+        sys.exit(1)
+
+    server = make_server(HOST, PORT, app, threaded=True, fd=fd)
+    # Let request threads finish on shutdown instead of dying with the process
+    server.daemon_threads = False
+    server.block_on_close = True
+
+    def drain(*_):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, drain)
+
+    if ready_fd >= 0:
+        os.write(ready_fd, b"ready\n")
+        os.close(ready_fd)
+
+    server.serve_forever()
+    server.server_close()
+
+
+if __name__ == "__main__":
+    RollingSupervisor().run()
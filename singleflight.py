@@ -0,0 +1,113 @@
+"""
+Single-flight request coalescing.
+
+Concurrent callers asking for the same key share one computation: the first
+caller runs it and everyone else waits for its result (or its exception).
+
+FileLockSingleFlight extends this across processes on the same host (e.g.
+gunicorn workers) with an fcntl lock file per key; callers that waited on the
+lock should re-check their shared cache before computing.
+"""
+import hashlib
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process coalescing only
+    fcntl = None
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key, fn, recheck=None):
+        """
+        Run fn() once per key at a time; returns (result, shared).
+        The leader calls recheck() first and skips fn() if it returns something.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            found = recheck() if recheck is not None else None
+            call.result = found if found is not None else fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": self.in_flight()}
+
+
+class FileLockSingleFlight(SingleFlight):
+    """
+    Threads in this process coalesce in memory; the leader then takes an
+    exclusive lock on <lock_dir>/<hash>.lock so only one process on the host
+    computes a key at a time. `recheck()` runs after the lock is acquired and,
+    if it returns something other than None, is used instead of calling fn().
+    Lock files are left in place: removing one while another process waits on
+    it would let a third process lock a fresh file and run concurrently.
+    """
+
+    def __init__(self, lock_dir):
+        super().__init__()
+        self.lock_dir = lock_dir
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def do(self, key, fn, recheck=None):
+        if fcntl is None:
+            return super().do(key, fn, recheck)
+
+        def locked():
+            name = hashlib.sha1(key.encode("utf-8")).hexdigest() + ".lock"
+            path = os.path.join(self.lock_dir, name)
+            with open(path, "a+") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    if recheck is not None:
+                        found = recheck()
+                        if found is not None:
+                            return found
+                    return fn()
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        return super().do(key, locked)
@@ -0,0 +1,161 @@
+"""
+Append-only auto-maintain history (patches, restarts, ...) in SQLite.
+
+Replaces auto_maintain_state.json, which was read and rewritten whole on
+every change. Appends are single INSERTs, so concurrent writers (the app's
+workers, auto_maintain, auto_patch_runner) can't corrupt each other, and the
+dashboard reads only the page it shows through an index.
+
+    store = StateStore("instance/auto_maintain_state.db", legacy_json="auto_maintain_state.json")
+    store.append("patch", file="app.py", patch=diff_text)
+    store.latest("patch", limit=20, offset=0)
+    store.record_restart(); store.counter("restarts")
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class StateStore:
+    def __init__(self, db_path, legacy_json=None):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_events_kind ON events(kind, id)")
+        # Totals survive compaction, unlike the events they count
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        conn.commit()
+
+        if legacy_json:
+            self._migrate(legacy_json)
+
+    def _conn(self):
+        # One connection per thread (and per process, since workers fork after import)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _migrate(self, legacy_json):
+        """Import an old auto_maintain_state.json once, then move it aside."""
+        if not os.path.exists(legacy_json):
+            return
+        try:
+            with open(legacy_json) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+
+        conn = self._conn()
+        with conn:
+            # BEGIN IMMEDIATE so two processes starting together don't both import it
+            conn.execute("BEGIN IMMEDIATE")
+            if not os.path.exists(legacy_json):
+                return
+            for patch in state.get("patches", []):
+                conn.execute(
+                    "INSERT INTO events (kind, created_at, data) VALUES ('patch', ?, ?)",
+                    (time.time(), json.dumps(patch)),
+                )
+            if state.get("restarts"):
+                self._incr(conn, "restarts", int(state["restarts"]))
+            os.replace(legacy_json, legacy_json + ".migrated")
+
+    @staticmethod
+    def _incr(conn, name, by):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            (name, by),
+        )
+
+    # ---------------------------
+    # Writes
+    # ---------------------------
+    def append(self, kind, **data):
+        """Add one event; returns its id."""
+        data.setdefault("time", time.strftime("%Y-%m-%d %H:%M:%S"))
+        conn = self._conn()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO events (kind, created_at, data) VALUES (?, ?, ?)",
+                (kind, time.time(), json.dumps(data, default=str)),
+            )
+        return cursor.lastrowid
+
+    def incr(self, name, by=1):
+        conn = self._conn()
+        with conn:
+            self._incr(conn, name, by)
+
+    def record_restart(self, **data):
+        conn = self._conn()
+        data.setdefault("time", time.strftime("%Y-%m-%d %H:%M:%S"))
+        with conn:
+            conn.execute(
+                "INSERT INTO events (kind, created_at, data) VALUES ('restart', ?, ?)",
+                (time.time(), json.dumps(data, default=str)),
+            )
+            self._incr(conn, "restarts", 1)
+
+    # ---------------------------
+    # Reads
+    # ---------------------------
+    def latest(self, kind, limit=20, offset=0):
+        """Newest-first page of events of one kind."""
+        rows = self._conn().execute(
+            "SELECT id, data FROM events WHERE kind = ? ORDER BY id DESC LIMIT ? OFFSET ?",
+            (kind, limit, offset),
+        ).fetchall()
+        return [dict(json.loads(data), id=event_id) for event_id, data in rows]
+
+    def count(self, kind):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM events WHERE kind = ?", (kind,)
+        ).fetchone()[0]
+
+    def counter(self, name):
+        row = self._conn().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    # ---------------------------
+    # Maintenance
+    # ---------------------------
+    def compact(self, keep=1000):
+        """Drop all but the newest `keep` events of each kind. Returns rows removed."""
+        conn = self._conn()
+        with conn:
+            removed = conn.execute(
+                """
+                DELETE FROM events WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY kind ORDER BY id DESC) AS rn
+                        FROM events
+                    ) WHERE rn > ?
+                )
+                """,
+                (keep,),
+            ).rowcount
+        if removed:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return removed
@@ -0,0 +1,24 @@
+from explanation_engine import ExplanationEngine
+
+
+class EmptyCache:
+    def get(self, key):
+        return None
+
+    def peek_many(self, keys):
+        return {}
+
+    def put(self, key, question_text, explanation):
+        pass
+
+
+def no_model(*args):
+    raise AssertionError("the model must not be called in offline mode")
+
+
+def test_offline_mode_never_calls_the_model_without_bank_text():
+    engine = ExplanationEngine(EmptyCache(), no_model, mode="offline", stream_generate=no_model)
+    assert engine.explain("Unknown question?", "a", "b", ["a", "b"]) == ("", "bundled")
+    assert list(engine.stream("Unknown question?", "a", "b", ["a", "b"])) == [
+        ("delta", ""), ("done", "", "bundled"),
+    ]
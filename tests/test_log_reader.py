@@ -0,0 +1,47 @@
+import os
+
+from log_reader import LogFollower, tail_text
+
+
+def append(path, text):
+    with open(path, "a") as f:
+        f.write(text)
+
+
+def test_lines_written_to_the_old_file_before_rotation_are_not_lost(tmp_path):
+    log = str(tmp_path / "error.log")
+    append(log, "one\n")
+    follower = LogFollower(log, str(tmp_path / "offset.json"))
+    assert follower.read_new() == ["one\n"]
+
+    # The logger writes once more, then rotates the file (like RotatingFileHandler)
+    append(log, "two\n")
+    os.rename(log, log + ".1")
+    append(log, "three\n")
+
+    assert follower.read_new() == ["two\n", "three\n"]
+    append(log, "four\n")
+    assert follower.read_new() == ["four\n"]
+    follower.close()
+
+
+def test_truncated_file_is_read_from_the_start(tmp_path):
+    log = str(tmp_path / "error.log")
+    append(log, "a long first line\n")
+    follower = LogFollower(log)
+    assert follower.read_new() == ["a long first line\n"]
+
+    with open(log, "w") as f:
+        f.write("new\n")
+    assert follower.read_new() == ["new\n"]
+    follower.close()
+
+
+def test_tail_text_whole_lines_drops_the_line_the_cut_lands_in(tmp_path):
+    log = str(tmp_path / "error.log")
+    append(log, "first\nsecond\n")
+    assert tail_text(log, 9) == "t\nsecond\n"
+    assert tail_text(log, 9, whole_lines=True) == "second\n"
+    # A cut right after a newline keeps the whole next line
+    assert tail_text(log, 7, whole_lines=True) == "second\n"
+    assert tail_text(log, 100, whole_lines=True) == "first\nsecond\n"
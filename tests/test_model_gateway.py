@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+import pytest
+
+from model_gateway import GatewayBusyError, ModelGateway
+
+
+class Upstream:
+    """Fake OpenAI client: fails while `failing` is set, otherwise answers "ok"."""
+
+    def __init__(self):
+        self.failing = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, timeout=None, **kwargs):
+        if self.failing:
+            raise ConnectionError("upstream down")
+        return "ok"
+
+
+def test_busy_half_open_call_does_not_keep_the_breaker_open():
+    upstream = Upstream()
+    gateway = ModelGateway(upstream, max_in_flight=1, acquire_timeout=0.05, retries=0,
+                           failure_threshold=1, reset_timeout=0)
+
+    upstream.failing = True
+    with pytest.raises(ConnectionError):
+        gateway.create(model="m")
+    assert gateway.breaker.state == "open"
+
+    # Half-open, but every slot is taken: the call is refused as busy...
+    upstream.failing = False
+    assert gateway._slots.acquire(timeout=1)
+    with pytest.raises(GatewayBusyError):
+        gateway.create(model="m")
+    gateway._slots.release()
+
+    # ...and must not have used up the probe, or no call would ever be let through again
+    assert gateway.create(model="m") == "ok"
+    assert gateway.breaker.state == "closed"
@@ -0,0 +1,25 @@
+from patch_pipeline import apply_hunks, parse_unified_diff
+
+
+def apply(original, patch):
+    [(_, _, hunks)] = parse_unified_diff(patch)
+    return apply_hunks(original, hunks)
+
+
+def test_pure_insertion_goes_after_the_named_line():
+    patch = "--- a/f.py\n+++ b/f.py\n@@ -3,0 +4 @@\n+X\n"
+    assert apply(["a\n", "b\n", "c\n", "d\n"], patch) == ["a\n", "b\n", "c\n", "X\n", "d\n"]
+
+
+def test_insertion_at_the_top_of_the_file():
+    patch = "--- a/f.py\n+++ b/f.py\n@@ -0,0 +1 @@\n+X\n"
+    assert apply(["a\n", "b\n"], patch) == ["X\n", "a\n", "b\n"]
+
+
+def test_insertion_after_an_earlier_hunk_changed_the_length():
+    patch = (
+        "--- a/f.py\n+++ b/f.py\n"
+        "@@ -1 +1,2 @@\n-a\n+a1\n+a2\n"
+        "@@ -3,0 +5 @@\n+X\n"
+    )
+    assert apply(["a\n", "b\n", "c\n", "d\n"], patch) == ["a1\n", "a2\n", "b\n", "c\n", "X\n", "d\n"]